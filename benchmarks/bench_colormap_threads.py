@@ -0,0 +1,53 @@
+"""
+Measures the time needed to apply a colormap to a large array, with the
+values evaluated at once or by chunks on 1, 2, 4, ... threads.
+
+    python benchmarks/bench_colormap_threads.py [number of values]
+
+"""
+
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+
+import branca.colormap as cm
+
+REPEAT = 5
+
+
+def timed(function) -> float:
+    timings = []
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000_000
+    cpus = os.cpu_count() or 1
+    workers = [None] + [2**k for k in range(cpus.bit_length()) if 2**k <= cpus]
+
+    colormap = cm.linear.viridis.scale(0, 1)
+    x = np.random.default_rng(0).random(size)
+    out = np.empty(x.shape + (4,), dtype=np.uint8)
+
+    print(f"{size} values, {cpus} CPUs")
+    for lut in [None, 256]:
+        reference = timed(lambda: colormap.rgba_bytes_array(x, lut=lut, out=out))
+        for n in workers:
+            timing = timed(
+                lambda: colormap.rgba_bytes_array(x, lut=lut, out=out, workers=n),
+            )
+            print(
+                f"lut={lut!s:<5} workers={n!s:<5} {timing * 1000:9.1f} ms"
+                f"  x{reference / timing:5.2f}",
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""
+Measures the time needed to import `branca.colormap` in a fresh process,
+and to access a built-in colormap for the first time.
+
+    python benchmarks/bench_import.py
+
+"""
+
+import statistics
+import subprocess
+import sys
+
+REPEAT = 10
+
+
+def timed(setup: str, statement: str) -> float:
+    code = (
+        "import time\n"
+        f"{setup}\n"
+        "start = time.perf_counter()\n"
+        f"{statement}\n"
+        "print(time.perf_counter() - start)\n"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", code],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    return float(output)
+
+
+def main():
+    cases = {
+        # Import the dependencies first so only branca itself is measured.
+        "import branca.colormap": ("import jinja2, numpy", "import branca.colormap"),
+        "first access to linear.viridis": (
+            "import branca.colormap as cm",
+            "cm.linear.viridis",
+        ),
+        "build all linear colormaps": (
+            "import branca.colormap as cm",
+            "cm.linear._colormaps",
+        ),
+    }
+    for name, (setup, statement) in cases.items():
+        timings = [timed(setup, statement) * 1000 for _ in range(REPEAT)]
+        print(f"{name:<35} {statistics.median(timings):8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
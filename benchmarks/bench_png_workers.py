@@ -0,0 +1,59 @@
+"""
+Measures the time needed to encode a large image to PNG, with the image data
+compressed by a single zlib stream or in parallel by 1, 2, 4, ... threads.
+
+    python benchmarks/bench_png_workers.py [image height] [image width]
+
+"""
+
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+
+from branca.utilities import write_png
+
+REPEAT = 3
+
+
+def timed(function) -> float:
+    timings = []
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def main():
+    height = int(sys.argv[1]) if len(sys.argv) > 1 else 4096
+    width = int(sys.argv[2]) if len(sys.argv) > 2 else 4096
+    cpus = os.cpu_count() or 1
+    workers = [2**k for k in range(cpus.bit_length()) if 2**k <= cpus]
+
+    y, x = np.mgrid[0:height, 0:width]
+    image = np.sin(x / 97.0) * np.cos(y / 61.0)
+    image += np.random.default_rng(0).normal(scale=0.05, size=image.shape)
+
+    print(f"{height}x{width} image, {cpus} CPUs")
+    for compression in [1, 6, 9]:
+        reference = timed(lambda: write_png(image, compression=compression))
+        size = len(write_png(image, compression=compression))
+        print(
+            f"compression={compression} workers=None  {reference * 1000:9.1f} ms  {size} bytes"
+        )
+        for n in workers:
+            timing = timed(
+                lambda: write_png(image, compression=compression, workers=n),
+            )
+            size = len(write_png(image, compression=compression, workers=n))
+            print(
+                f"compression={compression} workers={n!s:<5} {timing * 1000:9.1f} ms"
+                f"  {size} bytes  x{reference / timing:5.2f}",
+            )
+
+
+if __name__ == "__main__":
+    main()
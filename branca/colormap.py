@@ -6,78 +6,1267 @@ Utility module for dealing with colormaps.
 
 """
 
-import json
 import math
 import os
-from typing import Dict, List, Optional, Sequence, Tuple, Union
+import sys
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
 
 from jinja2 import Template
 
 from branca.element import ENV, Figure, JavascriptLink, MacroElement
-from branca.utilities import legend_scaler
+from branca.utilities import _load_json, legend_scaler
+
+try:
+    import numpy as np
+except ImportError:
+    np = None  # type: ignore
 
 rootpath: str = os.path.abspath(os.path.dirname(__file__))
 
-with open(os.path.join(rootpath, "_cnames.json")) as f:
-    _cnames: Dict[str, str] = json.loads(f.read())
 
-with open(os.path.join(rootpath, "_schemes.json")) as f:
-    _schemes: Dict[str, List[str]] = json.loads(f.read())
+TypeRGBInts = Tuple[int, int, int]
+TypeRGBFloats = Tuple[float, float, float]
+TypeRGBAInts = Tuple[int, int, int, int]
+TypeRGBAFloats = Tuple[float, float, float, float]
+TypeAnyColorType = Union[TypeRGBInts, TypeRGBFloats, TypeRGBAInts, TypeRGBAFloats, str]
+
+
+def _is_hex(x: str) -> bool:
+    return x.startswith("#") and len(x) in (4, 5, 7, 9)
+
+
+def _parse_hex(color_code: str) -> TypeRGBAFloats:
+    """Parses a "#RGB", "#RGBA", "#RRGGBB" or "#RRGGBBAA" color code."""
+    if len(color_code) in (4, 5):
+        color_code = "#" + "".join(2 * c for c in color_code[1:])
+    return (
+        _color_int_to_float(int(color_code[1:3], 16)),
+        _color_int_to_float(int(color_code[3:5], 16)),
+        _color_int_to_float(int(color_code[5:7], 16)),
+        _color_int_to_float(int(color_code[7:9], 16)) if len(color_code) == 9 else 1.0,
+    )
+
+
+def _get_cnames() -> Dict[str, str]:
+    """The CSS color names and their "#RRGGBB" codes, loaded on first use.
+    The dictionary is shared and must not be modified.
+    """
+    return _load_json("_cnames.json")
+
+
+def _get_schemes() -> Dict[str, List[str]]:
+    """The built-in color schemes as lists of "#RRGGBB" codes,
+    loaded on first use. The dictionary is shared and must not be modified.
+    """
+    return _load_json("_schemes.json")
+
+
+@lru_cache(maxsize=None)
+def _get_cname_colors() -> Dict[str, TypeRGBAFloats]:
+    """The CSS color names and their parsed RGBA floats."""
+    return {name: _parse_hex(code) for name, code in _get_cnames().items()}
+
+
+@lru_cache(maxsize=None)
+def _get_scheme_table() -> Tuple[Dict[str, slice], Tuple[TypeRGBAFloats, ...]]:
+    """The colors of all built-in schemes parsed into one flat tuple of RGBA
+    floats, along with the slice of that tuple covered by each scheme.
+    """
+    slices = {}
+    colors: List[TypeRGBAFloats] = []
+    for name, codes in _get_schemes().items():
+        slices[name] = slice(len(colors), len(colors) + len(codes))
+        colors.extend(_parse_hex(code) for code in codes)
+    return slices, tuple(colors)
+
+
+def _get_scheme_colors(name: str) -> Tuple[TypeRGBAFloats, ...]:
+    """The parsed RGBA float colors of a built-in scheme."""
+    slices, colors = _get_scheme_table()
+    return colors[slices[name]]
+
+
+def __getattr__(name: str) -> Any:
+    # The color tables used to be loaded at import as module attributes.
+    # Copies are returned, so that callers cannot modify the shared tables.
+    if name == "_cnames":
+        return dict(_get_cnames())
+    if name == "_schemes":
+        return {key: list(codes) for key, codes in _get_schemes().items()}
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def _color_int_to_float(x: int) -> float:
+    """Convert an integer between 0 and 255 to a float between 0. and 1.0"""
+    return x / 255.0
+
+
+def _color_float_to_int(x: float) -> int:
+    """Convert a float between 0. and 1.0 to an integer between 0 and 255"""
+    return int(x * 255.9999)
+
+
+def _check_numpy():
+    if np is None:
+        raise ImportError("The NumPy package is required for this functionality")
+
+
+_hex_table: Any = None
+
+
+def hex_encode(colors: Any, alpha: bool = True) -> Any:
+    """Encodes an array of RGB(A) byte colors into hexadecimal strings.
+
+    Parameters
+    ----------
+    colors : array-like of ints between 0 and 255
+        An array of shape `(..., 3)` or `(..., 4)`, for example the output
+        of `ColorMap.rgba_bytes_array`.
+    alpha : bool, default True
+        Whether to return "#RRGGBBAA" strings rather than "#RRGGBB".
+        Colors without an alpha channel are considered opaque.
+
+    Returns
+    -------
+    An array of strings of shape `colors.shape[:-1]`.
+    """
+    global _hex_table
+    _check_numpy()
+    if _hex_table is None:
+        _hex_table = np.frombuffer(
+            b"".join(b"%02x" % i for i in range(256)),
+            dtype=np.uint8,
+        ).reshape(256, 2)
+
+    colors = np.asarray(colors)
+    if colors.shape[-1:] not in [(3,), (4,)]:
+        raise ValueError("Colors must be an array of shape (..., 3) or (..., 4).")
+    shape = colors.shape[:-1]
+    colors = colors.reshape(-1, colors.shape[-1]).astype(np.uint8, copy=False)
+    if not alpha:
+        colors = colors[:, :3]
+    elif colors.shape[1] == 3:
+        colors = np.concatenate(
+            [colors, np.full((len(colors), 1), 255, dtype=np.uint8)],
+            axis=1,
+        )
+
+    width = 1 + 2 * colors.shape[1]
+    buffer = np.empty((len(colors), width), dtype=np.uint8)
+    buffer[:, 0] = ord("#")
+    buffer[:, 1:] = _hex_table[colors].reshape(len(colors), width - 1)
+    return buffer.view(f"S{width}").astype(f"<U{width}").reshape(shape)
+
+
+def _lut_indices(x: Any, vmin: float, vmax: float, n: int) -> Any:
+    """Maps the values of `x` to the nearest entry of a lookup table of `n`
+    colors sampled regularly between `vmin` and `vmax`.
+    """
+    factor = (n - 1) / (vmax - vmin) if vmax > vmin else 0.0
+    indices = (np.asarray(x, dtype=float) - vmin) * factor + 0.5
+    np.clip(indices, 0, n - 1, out=indices)
+    return indices.astype(np.intp)
+
+
+def _as_float_array(x: Any) -> Any:
+    """Converts `x` to a float NumPy array, without copy when it already is
+    one. Anything NumPy accepts is supported, including objects exposing the
+    buffer protocol and Arrow arrays. Missing values (masked values, pandas
+    and Arrow nulls) become NaN.
+    """
+    if np.ma.isMaskedArray(x):
+        return np.ma.filled(x.astype(float), np.nan)
+    if hasattr(x, "to_numpy"):
+        try:
+            # pandas objects, including nullable dtypes.
+            return np.asarray(x.to_numpy(dtype=float, na_value=np.nan))
+        except TypeError:
+            pass
+    return np.asarray(x, dtype=float)
+
+
+# Number of values evaluated at once by each thread when `workers` is given,
+# so that the temporary arrays of a chunk stay in the CPU caches.
+_CHUNK_SIZE = 1 << 15
+
+
+def _rgba_bytes_array(
+    colormap: Any,
+    x: Any,
+    lut: Optional[int],
+    out: Any,
+    missing: Optional[TypeAnyColorType],
+    workers: Optional[int] = None,
+    chunk_size: int = _CHUNK_SIZE,
+) -> Any:
+    """Implements `rgba_bytes_array` for a ColorMap or a ColorScale."""
+    _check_numpy()
+    x = _as_float_array(x)
+    shape = x.shape + (4,)
+    if out is None:
+        out = np.empty(shape, dtype=np.uint8)
+    elif isinstance(out, np.ndarray):
+        if out.shape != shape or out.dtype != np.uint8:
+            raise ValueError(
+                f"`out` must be a uint8 array of shape {shape}, "
+                f"got {out.dtype} array of shape {out.shape}.",
+            )
+    else:
+        # Any writable buffer of the right size, like a bytearray.
+        out = np.frombuffer(out, dtype=np.uint8).reshape(shape)
+
+    if workers is None:
+        _rgba_bytes_chunk(colormap, x, lut, out, missing)
+        return out
+
+    if workers < 1:
+        raise ValueError("`workers` must be a positive integer.")
+    if not out.flags.c_contiguous:
+        raise ValueError("`out` must be C-contiguous when `workers` is given.")
+    if lut is not None:
+        # Computed once here rather than concurrently by the threads.
+        colormap.to_lut(lut)
+    flat_x, flat_out = x.reshape(-1), out.reshape(-1, 4)
+
+    def evaluate(start: int):
+        end = start + chunk_size
+        _rgba_bytes_chunk(
+            colormap, flat_x[start:end], lut, flat_out[start:end], missing
+        )
+
+    starts = range(0, flat_x.size, chunk_size)
+    if workers == 1:
+        for start in starts:
+            evaluate(start)
+    else:
+        # NumPy releases the GIL in the array operations, so the chunks are
+        # evaluated in parallel.
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for _ in pool.map(evaluate, starts):
+                pass
+    return out
+
+
+def _rgba_bytes_chunk(
+    colormap: Any,
+    x: Any,
+    lut: Optional[int],
+    out: Any,
+    missing: Optional[TypeAnyColorType],
+):
+    """Writes the colors of the float array `x` into the uint8 array `out`."""
+    nan = np.isnan(x)
+    has_nan = nan.any()
+    if has_nan:
+        x = np.where(nan, colormap.index[0], x)
+
+    if lut is not None:
+        table = colormap.to_lut(lut)
+        indices = _lut_indices(x, colormap.index[0], colormap.index[-1], lut)
+        np.take(table, indices, axis=0, out=out)
+    else:
+        # Same conversion as `_color_float_to_int`, in place.
+        colors = colormap.rgba_floats_array(x)
+        colors *= 255.9999
+        np.copyto(out, colors, casting="unsafe")
+
+    if has_nan:
+        if missing is None:
+            out[nan] = 0
+        else:
+            out[nan] = [_color_float_to_int(u) for u in _parse_color(missing)]
+
+
+def _hex_codes(colors: Any, alpha: bool) -> Tuple[Any, Any]:
+    """Dictionary-encodes an array of RGBA bytes of shape `shape + (4,)`
+    into integer codes of shape `shape` and the array of the unique colors
+    as hexadecimal strings.
+    """
+    colors = np.ascontiguousarray(colors)
+    if not alpha:
+        colors[..., 3] = 255
+    keys = colors.view(np.uint32)[..., 0]
+    unique, codes = np.unique(keys.ravel(), return_inverse=True)
+    codes = codes.astype(np.int32).reshape(keys.shape)
+    return codes, hex_encode(unique.view(np.uint8).reshape(-1, 4), alpha=alpha)
+
+
+def _parse_color(x: Union[tuple, list, str]) -> TypeRGBAFloats:
+    if isinstance(x, (tuple, list)):
+        return tuple(tuple(x) + (1.0,))[:4]  # type: ignore
+    elif isinstance(x, str):
+        return _parse_color_str(x)
+    else:
+        raise ValueError(f"Unrecognized color code {x!r}")
+
+
+@lru_cache(maxsize=4096)
+def _parse_color_str(x: str) -> TypeRGBAFloats:
+    if _is_hex(x):
+        return _parse_hex(x)
+    color = _get_cname_colors().get(x.lower(), None)
+    if color is None:
+        raise ValueError(f"Unknown color {x!r}.")
+    return color
+
+
+def _parse_colors(colors: Any) -> List[TypeRGBAFloats]:
+    """Parses a sequence of colors into a list of RGBA float tuples.
+
+    A numeric NumPy array of shape (N, 3) or (N, 4) is converted at once,
+    other colors go through `_parse_color`, which memoizes string codes.
+    """
+    if np is not None and isinstance(colors, np.ndarray) and colors.dtype.kind in "iuf":
+        if colors.ndim != 2 or colors.shape[1] not in (3, 4):
+            raise ValueError("Colors must be an array of shape (N, 3) or (N, 4).")
+        colors = colors.astype(float)
+        if colors.shape[1] == 3:
+            colors = np.concatenate([colors, np.ones((len(colors), 1))], axis=1)
+        return list(map(tuple, colors.tolist()))
+    return [_parse_color(x) for x in colors]
+
+
+def parse_colors(colors: Any) -> Any:
+    """Parses a list or array of colors into an array of RGBA floats.
+
+    Parameters
+    ----------
+    colors : list-like object or array of shape (N, 3) or (N, 4)
+        Colors can be provided in the form:
+        * tuples of RGB(A) numbers, to which an alpha of 1. is added if
+        missing (e.g: `(1., 1., 0.)` or `(1., 1., 0., 0.5)`)
+        * HTML-like strings "#RGB", "#RGBA", "#RRGGBB" or "#RRGGBBAA"
+        (e.g: `"#ff0"` or `"#ffff0080"`)
+        * a color name or shortcut (e.g: `"y"` or `"yellow"`)
+
+    Returns
+    -------
+    A float array of shape (N, 4).
+    """
+    _check_numpy()
+    return np.array(_parse_colors(colors), dtype=float).reshape(-1, 4)
+
+
+class CacheInfo(NamedTuple):
+    """Statistics of the hexadecimal color cache of a ColorMap."""
+
+    hits: int
+    misses: int
+    maxsize: int
+    currsize: int
+
+
+def _base(x: float) -> float:
+    if x > 0:
+        base = pow(10, math.floor(math.log10(x)))
+        return round(x / base) * base
+    else:
+        return 0
+
+
+def _iter_chunks(data: Any) -> Any:
+    """Yields the values of `data` as flat float arrays.
+
+    `data` can be an array-like object, or an iterable of array-like chunks
+    (for example a generator reading a large file piece by piece).
+    """
+    if hasattr(data, "__len__") or hasattr(data, "__array__"):
+        try:
+            yield np.asarray(data, dtype=float).ravel()
+            return
+        except (TypeError, ValueError):
+            pass  # A sequence of chunks of different lengths.
+    for chunk in data:
+        yield np.asarray(chunk, dtype=float).ravel()
+
+
+def _min_max(values: Any, block_size: int = 65536) -> Tuple[float, float]:
+    """Computes the minimum and maximum of an array in a single pass over
+    memory, ignoring NaN values.
+    """
+    min_, max_ = math.inf, -math.inf
+    for start in range(0, len(values), block_size):
+        block = values[start : start + block_size]
+        min_ = min(min_, float(np.fmin.reduce(block)))
+        max_ = max(max_, float(np.fmax.reduce(block)))
+    return min_, max_
+
+
+class _QuantileSketch:
+    """A bounded-memory summary of a stream of values, giving approximate
+    quantiles along with the exact minimum and maximum.
+
+    This is a merging t-digest: the values are summarized by at most about
+    `compression` weighted centroids, smaller near the tails of the
+    distribution so that extreme quantiles stay accurate.
+    """
+
+    def __init__(self, compression: int = 200):
+        self.compression = compression
+        self.means = np.empty(0)
+        self.weights = np.empty(0)
+        self.count = 0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def update(self, values: Any):
+        """Adds the values of an array to the summary."""
+        values = np.asarray(values, dtype=float).ravel()
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return
+        self.count += len(values)
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+
+        # Merge the existing centroids into the sorted new values.
+        values.sort()
+        positions = np.searchsorted(values, self.means)
+        means = np.insert(values, positions, self.means)
+        weights = np.insert(np.ones(len(values)), positions, self.weights)
+
+        # Group consecutive centroids according to the arcsine scale
+        # function, which allows bigger groups around the median.
+        cumulated = np.cumsum(weights)
+        q = (cumulated - weights / 2) / cumulated[-1]
+        k = np.floor(self.compression * (np.arcsin(2 * q - 1) / np.pi + 0.5))
+        starts = np.flatnonzero(np.diff(k, prepend=-1))
+        self.weights = np.add.reduceat(weights, starts)
+        self.means = np.add.reduceat(means * weights, starts) / self.weights
+
+    def quantile(self, quantiles: Sequence[float]) -> Any:
+        """Estimates the given quantiles, each between 0 and 1."""
+        centers = np.cumsum(self.weights) - self.weights / 2
+        return np.interp(
+            np.asarray(quantiles, dtype=float) * self.count,
+            np.concatenate([[0], centers, [self.count]]),
+            np.concatenate([[self.min], self.means, [self.max]]),
+        )
+
+
+def _data_values(data: Any) -> Any:
+    """Gathers the non-NaN values of `data` (see `_iter_chunks`) into a new
+    flat array.
+    """
+    chunks = [chunk[~np.isnan(chunk)] for chunk in _iter_chunks(data)]
+    values = np.concatenate([np.empty(0)] + chunks)
+    if not len(values):
+        raise ValueError("`data` must contain at least one value.")
+    return values
+
+
+def _jenks_breaks(
+    values: Any,
+    n: int,
+    sample_size: Optional[int] = None,
+) -> List[float]:
+    """Computes Fisher-Jenks natural breaks: the split of the sorted values
+    into `n` classes minimizing the sum of squared deviations from the class
+    means.
+
+    Returns the minimum, the lowest value of each class but the first, and
+    the maximum. The optimization runs on the distinct values weighted by
+    their counts. If there are more than `sample_size` values, it runs on a
+    random sample of them (along with the minimum and maximum).
+
+    The dynamic programming uses the fact that the optimal start of the last
+    class is non-decreasing with the number of values, which allows to
+    compute each of the `n` steps by divide and conquer in O(m log(m)) for
+    m distinct values, instead of O(m²).
+    """
+    if sample_size is not None and len(values) > sample_size:
+        sample = np.random.default_rng(0).choice(values, sample_size, replace=False)
+        values = np.concatenate([sample, [values.min(), values.max()]])
+    x, counts = np.unique(values, return_counts=True)
+    m = len(x)
+    n = min(n, m)
+
+    # Prefix sums of weights, values and squares, centered for precision.
+    centered = x - x.mean()
+    w = np.concatenate([[0.0], np.cumsum(counts)])
+    s = np.concatenate([[0.0], np.cumsum(counts * centered)])
+    q = np.concatenate([[0.0], np.cumsum(counts * centered**2)])
+
+    def ssd(i: Any, j: Any) -> Any:
+        """Sum of squared deviations of the class made of values i to j-1."""
+        total = s[j] - s[i]
+        return q[j] - q[i] - total * total / (w[j] - w[i])
+
+    # cost[j] is the minimal cost of splitting the first j values
+    # into the current number of classes.
+    cost = np.full(m + 1, np.inf)
+    cost[1:] = ssd(np.zeros(m, dtype=np.intp), np.arange(1, m + 1))
+    starts = np.zeros((n + 1, m + 1), dtype=np.intp)
+    for k in range(2, n + 1):
+        new_cost = np.full(m + 1, np.inf)
+        stack = [(k, m, k - 1, m - 1)]
+        while stack:
+            j_low, j_high, i_low, i_high = stack.pop()
+            if j_low > j_high:
+                continue
+            j = (j_low + j_high) // 2
+            candidates = np.arange(i_low, min(j - 1, i_high) + 1)
+            costs = cost[candidates] + ssd(candidates, j)
+            best = int(candidates[np.argmin(costs)])
+            new_cost[j] = costs.min()
+            starts[k, j] = best
+            stack.append((j_low, j - 1, i_low, best))
+            stack.append((j + 1, j_high, best, i_high))
+        cost = new_cost
+
+    breaks = []
+    j = m
+    for k in range(n, 1, -1):
+        j = starts[k, j]
+        breaks.append(float(x[j]))
+    return [float(x[0])] + breaks[::-1] + [float(x[-1])]
+
+
+def _equal_count_breaks(values: Any, n: int) -> List[float]:
+    """Splits the values into `n` classes holding the same number of values,
+    returning the minimum, the lowest value of each class but the first, and
+    the maximum.
+    """
+    ranks = [int(round(i * len(values) / n)) for i in range(n)] + [len(values) - 1]
+    values = values.copy()
+    values.partition(ranks)
+    return [float(values[rank]) for rank in ranks]
+
+
+def _head_tail_breaks(
+    values: Any,
+    n: Optional[int] = None,
+    head_ratio: float = 0.4,
+) -> List[float]:
+    """Computes head/tail breaks, suited to heavy-tailed distributions.
+
+    The values are split at their mean, then the head (values above the mean)
+    is split again at its own mean, as long as the head holds less than
+    `head_ratio` of the values and there are less than `n` classes.
+    """
+    breaks = [float(values.min())]
+    head = values
+    while len(head) > 1 and (n is None or len(breaks) < n):
+        mean = float(head.mean())
+        new_head = head[head > mean]
+        if not len(new_head) or (
+            len(breaks) > 1 and len(new_head) > head_ratio * len(head)
+        ):
+            break
+        breaks.append(mean)
+        head = new_head
+    return breaks + [float(values.max())]
+
+
+def _describe_data(
+    data: Any,
+    quantiles: Optional[Sequence[float]] = None,
+    approximate: bool = False,
+) -> Tuple[float, float, List[float]]:
+    """Computes the minimum, the maximum and the given quantiles of `data`.
+
+    The quantiles are linearly interpolated between the sorted values.
+    With NumPy, `data` can also be an iterable of chunks, NaN values are
+    ignored, and everything is computed in a single pass. If `approximate`
+    is True the values are never held in memory all together, and
+    quantiles are estimated with a `_QuantileSketch`.
+    """
+    if np is None:
+        if quantiles is None:
+            return min(data), max(data), []
+        s = sorted(data)
+        p = len(s) - 1
+        return (
+            s[0],
+            s[-1],
+            [
+                s[int(q * p)] * (1.0 - (q * p) % 1)
+                + s[min(int(q * p) + 1, p)] * ((q * p) % 1)
+                for q in quantiles
+            ],
+        )
+
+    msg = "`data` must contain at least one value."
+    if approximate:
+        sketch = _QuantileSketch()
+        for chunk in _iter_chunks(data):
+            sketch.update(chunk)
+        if not sketch.count:
+            raise ValueError(msg)
+        values = [] if quantiles is None else sketch.quantile(quantiles).tolist()
+        return sketch.min, sketch.max, values
+
+    if quantiles is None:
+        # One chunk at a time, without keeping them.
+        min_, max_ = math.inf, -math.inf
+        for chunk in _iter_chunks(data):
+            chunk_min, chunk_max = _min_max(chunk)
+            min_, max_ = min(min_, chunk_min), max(max_, chunk_max)
+        if min_ > max_:
+            raise ValueError(msg)
+        return min_, max_, []
+
+    values = _data_values(data)
+    p = len(values) - 1
+    positions = [q * p for q in quantiles]
+    ranks = {0, p}
+    for x in positions:
+        ranks.update([int(x), min(int(x) + 1, p)])
+    # A single partial sort puts all the needed order statistics in place.
+    values.partition(sorted(ranks))
+    return (
+        float(values[0]),
+        float(values[p]),
+        [
+            float(values[int(x)]) * (1.0 - x % 1)
+            + float(values[min(int(x) + 1, p)]) * (x % 1)
+            for x in positions
+        ],
+    )
+
+
+def _check_sorted(index: Sequence[float]):
+    if any(a > b for a, b in zip(index[:-1], index[1:])):
+        raise ValueError("Thresholds are not sorted.")
+
+
+class _ColorMethods:
+    """The methods computing colors, shared by ColorScale and ColorMap.
+    They rely on `rgba_floats_tuple`, `rgba_floats_array`, `index` and
+    `_lut_tables`.
+    """
+
+    __slots__ = ()
+
+    index: Sequence[float]
+
+    def rgba_floats_tuple(self, x: float) -> TypeRGBAFloats:
+        raise NotImplementedError
+
+    def _lut_tables(self) -> Dict[int, Any]:
+        """The lookup tables computed by `to_lut`, by number of colors."""
+        raise NotImplementedError
+
+    def rgba_bytes_tuple(self, x: float) -> TypeRGBAInts:
+        """Provides the color corresponding to value `x` in the
+        form of a tuple (R,G,B,A) with int values between 0 and 255.
+        """
+        return tuple(_color_float_to_int(u) for u in self.rgba_floats_tuple(x))  # type: ignore
+
+    def rgb_bytes_tuple(self, x: float) -> TypeRGBInts:
+        """Provides the color corresponding to value `x` in the
+        form of a tuple (R,G,B) with int values between 0 and 255.
+        """
+        return self.rgba_bytes_tuple(x)[:3]
+
+    def rgb_hex_str(self, x: float) -> str:
+        """Provides the color corresponding to value `x` in the
+        form of a string of hexadecimal values "#RRGGBB".
+        """
+        return "#%02x%02x%02x" % self.rgb_bytes_tuple(x)
+
+    def rgba_hex_str(self, x: float) -> str:
+        """Provides the color corresponding to value `x` in the
+        form of a string of hexadecimal values "#RRGGBBAA".
+        """
+        return "#%02x%02x%02x%02x" % self.rgba_bytes_tuple(x)
+
+    def __call__(self, x: float) -> str:
+        """Provides the color corresponding to value `x` in the
+        form of a string of hexadecimal values "#RRGGBBAA".
+        """
+        return self.rgba_hex_str(x)
+
+    def rgba_bytes_array(
+        self,
+        x: Any,
+        lut: Optional[int] = None,
+        out: Any = None,
+        missing: Optional[TypeAnyColorType] = None,
+        workers: Optional[int] = None,
+    ) -> Any:
+        """Provides the colors corresponding to the values of the array `x`
+        in the form of a uint8 array of shape `x.shape + (4,)`.
+
+        `x` can be anything NumPy converts to an array of numbers, such as an
+        object exposing the buffer protocol, a pandas Series or an Arrow
+        array. Float arrays are used without copy.
+
+        If `lut` is given, the colors are looked up in the table of `lut`
+        colors returned by `to_lut` instead of being computed exactly.
+
+        If `out` is given, the colors are written into it and it is returned.
+        It is either a uint8 array of shape `x.shape + (4,)` or a writable
+        buffer of `4 * x.size` bytes.
+
+        Missing values (NaN, masked values, pandas or Arrow nulls) get the
+        `missing` color, transparent by default.
+
+        If `workers` is given, the values are split into chunks small enough
+        to stay in the CPU caches, evaluated by a pool of `workers` threads.
+        This is faster for large arrays, even with ``workers=1``. Custom
+        subclasses must then implement `rgba_floats_array` with NumPy
+        operations to benefit from several threads.
+        """
+        return _rgba_bytes_array(
+            self,
+            x,
+            lut=lut,
+            out=out,
+            missing=missing,
+            workers=workers,
+        )
+
+    def to_lut(self, n: int = 256) -> Any:
+        """Samples the colormap into a lookup table of `n` colors.
+
+        The table is a read-only uint8 array of shape `(n, 4)`, entry `k`
+        holding the RGBA color of ``index[0] + k * h``, with
+        ``h = (index[-1] - index[0]) / (n - 1)``. It is computed once per `n`.
+        Use `rgba_bytes_array(x, lut=n)` to evaluate values through it: each
+        value is mapped to its nearest entry, so it is off by at most ``h / 2``.
+
+        The resulting worst-case color error is:
+
+        * for a `LinearColormap`, ``255 * s * h / 2`` levels per channel,
+          rounded up, `s` being the steepest slope of a channel (in color
+          units per unit of value). For a two-color ramp over a full channel
+          that is 1 level for n=256, 1024 or 4096. For an evenly spaced
+          9-color scheme with jumps of 0.3 between neighboring colors, it is
+          2 levels for n=256 and 1 level for n=1024 or 4096.
+        * for a `StepColormap`, colors are exact except for values closer
+          than ``h / 2`` to a threshold, which may get the color of the
+          neighboring step. That band is 1/510, 1/2046 and 1/8190 of the
+          colormap range for n=256, 1024 and 4096.
+        """
+        _check_numpy()
+        if n < 2:
+            raise ValueError("A lookup table needs at least 2 colors.")
+        luts = self._lut_tables()
+        table = luts.get(n)
+        if table is None:
+            table = self.rgba_bytes_array(
+                np.linspace(self.index[0], self.index[-1], n),
+            )
+            table.flags.writeable = False
+            luts[n] = table
+        return table
+
+    def rgb_hex_array(
+        self,
+        x: Any,
+        missing: Optional[TypeAnyColorType] = None,
+    ) -> Any:
+        """Provides the colors corresponding to the values of the array `x`
+        in the form of an array of strings "#RRGGBB".
+        """
+        return hex_encode(self.rgba_bytes_array(x, missing=missing), alpha=False)
+
+    def rgba_hex_array(
+        self,
+        x: Any,
+        missing: Optional[TypeAnyColorType] = None,
+    ) -> Any:
+        """Provides the colors corresponding to the values of the array `x`
+        in the form of an array of strings "#RRGGBBAA".
+        """
+        return hex_encode(self.rgba_bytes_array(x, missing=missing))
+
+    def rgb_hex_codes(
+        self,
+        x: Any,
+        lut: Optional[int] = None,
+        missing: Optional[TypeAnyColorType] = None,
+    ) -> Tuple[Any, Any]:
+        """Provides the colors corresponding to the values of the array `x`
+        dictionary-encoded: returns an int32 array `codes` of shape `x.shape`
+        and an array `colors` of the distinct "#RRGGBB" strings, such that
+        the color of `x[i]` is `colors[codes[i]]`.
+
+        They can be turned into a column without one string per value, with
+        `pandas.Categorical.from_codes(codes, colors)` or
+        `pyarrow.DictionaryArray.from_arrays(codes, colors)`.
+        See `rgba_bytes_array` for `lut` and `missing`.
+        """
+        colors = self.rgba_bytes_array(x, lut=lut, missing=missing)
+        return _hex_codes(colors, alpha=False)
+
+    def rgba_hex_codes(
+        self,
+        x: Any,
+        lut: Optional[int] = None,
+        missing: Optional[TypeAnyColorType] = None,
+    ) -> Tuple[Any, Any]:
+        """Provides the colors corresponding to the values of the array `x`
+        dictionary-encoded, like `rgb_hex_codes`, with "#RRGGBBAA" strings.
+        """
+        colors = self.rgba_bytes_array(x, lut=lut, missing=missing)
+        return _hex_codes(colors, alpha=True)
+
+
+class ColorScale(_ColorMethods):
+    """An immutable and hashable color scale.
+
+    A color scale only holds the data needed to compute colors: `index`,
+    `colors`, `vmin` and `vmax`, stored as tuples. Unlike a ColorMap it is not
+    an Element, so it is cheap to create, can be used as a dictionary key and
+    is pickled as just its data. Use `to_colormap` to get a ColorMap that can
+    be rendered as a legend.
+
+    This base class is not meant to be used directly, see `LinearScale` and
+    `StepScale`.
+    """
+
+    __slots__ = ("index", "colors", "vmin", "vmax", "_hash", "_cache")
+
+    index: Tuple[float, ...]
+    colors: Tuple[TypeRGBAFloats, ...]
+    vmin: float
+    vmax: float
+    _hash: Optional[int]
+    _cache: Dict[Any, Any]
+
+    @classmethod
+    def _from_parsed(
+        cls,
+        colors: Tuple[TypeRGBAFloats, ...],
+        index: Tuple[float, ...],
+        vmin: float,
+        vmax: float,
+    ) -> Any:
+        """Creates a scale from colors and an index already parsed and
+        validated, skipping the checks done by the constructor.
+        """
+        self = object.__new__(cls)
+        self._set(colors, index, vmin, vmax)
+        return self
+
+    def _set(
+        self,
+        colors: Tuple[TypeRGBAFloats, ...],
+        index: Tuple[float, ...],
+        vmin: float,
+        vmax: float,
+    ):
+        object.__setattr__(self, "colors", colors)
+        object.__setattr__(self, "index", index)
+        object.__setattr__(self, "vmin", vmin)
+        object.__setattr__(self, "vmax", vmax)
+        object.__setattr__(self, "_hash", None)
+        # Lookup arrays and tables derived from the data, computed when needed.
+        object.__setattr__(self, "_cache", {})
+
+    def __setattr__(self, name: str, value: Any):
+        raise AttributeError(f"{type(self).__name__} objects are immutable.")
+
+    def __delattr__(self, name: str):
+        raise AttributeError(f"{type(self).__name__} objects are immutable.")
+
+    def __reduce__(self) -> tuple:
+        return (
+            type(self)._from_parsed,
+            (self.colors, self.index, self.vmin, self.vmax),
+        )
+
+    def _key(self) -> tuple:
+        return (type(self), self.colors, self.index, self.vmin, self.vmax)
+
+    def __eq__(self, other: Any) -> bool:
+        if not isinstance(other, ColorScale):
+            return NotImplemented
+        return self._key() == other._key()
+
+    def __hash__(self) -> int:
+        if self._hash is None:
+            object.__setattr__(self, "_hash", hash(self._key()))
+        return self._hash  # type: ignore
+
+    def __repr__(self) -> str:
+        return (
+            f"{type(self).__name__}(colors={list(self.colors)!r}, "
+            f"index={list(self.index)!r}, vmin={self.vmin!r}, vmax={self.vmax!r})"
+        )
+
+    def _get_arrays(self) -> Tuple[Any, Any]:
+        """Returns `index` and `colors` as NumPy arrays, computed once."""
+        _check_numpy()
+        arrays = self._cache.get("arrays")
+        if arrays is None:
+            arrays = self._cache["arrays"] = (
+                np.asarray(self.index, dtype=float),
+                np.asarray(self.colors, dtype=float).reshape(-1, 4),
+            )
+        return arrays
+
+    def _lut_tables(self) -> Dict[int, Any]:
+        return self._cache.setdefault("luts", {})
+
+    def rgba_floats_tuple(self, x: float) -> TypeRGBAFloats:
+        """Provides the color corresponding to value `x` in the
+        form of a tuple (R,G,B,A) with float values between 0. and 1.
+        """
+        raise NotImplementedError
+
+    def rgba_floats_array(self, x: Any) -> Any:
+        """Provides the colors corresponding to the values of the array `x`
+        in the form of an array of shape `x.shape + (4,)` with float values
+        between 0. and 1.
+        """
+        raise NotImplementedError
+
+    def scale(self, vmin: float = 0.0, vmax: float = 1.0) -> Any:
+        """Transforms the scale so that the minimal and maximal values
+        fit the given parameters. The colors are shared with this scale.
+        """
+        index = tuple(
+            vmin + (vmax - vmin) * (x - self.vmin) * 1.0 / (self.vmax - self.vmin)
+            for x in self.index
+        )
+        # The index stays sorted unless the scale is reversed.
+        if (vmax - vmin) * (self.vmax - self.vmin) < 0:
+            _check_sorted(index)
+        return type(self)._from_parsed(self.colors, index, vmin, vmax)
+
+    def to_colormap(self, **kwargs: Any) -> "ColorMap":
+        """Wraps the scale into a ColorMap, which can be rendered as a
+        legend. Keyword arguments like `caption` are passed to the ColorMap.
+        """
+        raise NotImplementedError
+
+
+class LinearScale(ColorScale):
+    """An immutable color scale based on linear interpolation of a set of
+    colors over a given index.
+
+    See `LinearColormap` for the description of the parameters.
+    """
+
+    __slots__ = ()
+
+    def __init__(
+        self,
+        colors: Sequence[TypeAnyColorType],
+        index: Optional[Sequence[float]] = None,
+        vmin: float = 0.0,
+        vmax: float = 1.0,
+    ):
+        n = len(colors)
+        if n < 2:
+            raise ValueError("You must provide at least 2 colors.")
+        if index is None:
+            index = [vmin + (vmax - vmin) * i * 1.0 / (n - 1) for i in range(n)]
+        _check_sorted(index)
+        self._set(tuple(_parse_colors(colors)), tuple(index), vmin, vmax)
+
+    def _get_widths(self) -> Tuple[float, ...]:
+        """The width of each segment between two consecutive index values,
+        computed once.
+        """
+        widths = self._cache.get("widths")
+        if widths is None:
+            index = self.index
+            widths = self._cache["widths"] = (0.0,) + tuple(
+                b - a for a, b in zip(index[:-1], index[1:])
+            )
+        return widths
+
+    def rgba_floats_tuple(self, x: float) -> TypeRGBAFloats:
+        """Provides the color corresponding to value `x` in the
+        form of a tuple (R,G,B,A) with float values between 0. and 1.
+        """
+        index, colors = self.index, self.colors
+        if x <= index[0]:
+            return colors[0]
+        if x >= index[-1]:
+            return colors[-1]
+
+        i = bisect_left(index, x)  # 0 < i < n.
+        width = self._get_widths()[i]
+        p = (x - index[i - 1]) * 1.0 / width if width > 0 else 1.0
+
+        return tuple(  # type: ignore
+            (1.0 - p) * colors[i - 1][j] + p * colors[i][j] for j in range(4)
+        )
+
+    def rgba_floats_array(self, x: Any) -> Any:
+        """Provides the colors corresponding to the values of the array `x`
+        in the form of an array of shape `x.shape + (4,)` with float values
+        between 0. and 1.
+        """
+        index, colors = self._get_arrays()
+        x = _as_float_array(x)
+
+        i = np.searchsorted(index, x, side="left").clip(1, len(index) - 1)
+        lower, upper = index[i - 1], index[i]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            p = np.where(lower < upper, (x - lower) / (upper - lower), 1.0)
+        # Values out of the index, like infinite ones, get the colors of its
+        # ends below, but must not make the interpolation overflow.
+        np.clip(p, 0.0, 1.0, out=p)
+        p = p[..., np.newaxis]
+        out = (1.0 - p) * colors[i - 1] + p * colors[i]
+
+        # In the order of `rgba_floats_tuple`, for an index of equal values.
+        out[x >= index[-1]] = colors[-1]
+        out[x <= index[0]] = colors[0]
+        return out
+
+    def to_step(
+        self,
+        n: Optional[int] = None,
+        index: Optional[Sequence[float]] = None,
+        data: Any = None,
+        method: str = "linear",
+        quantiles: Optional[Sequence[float]] = None,
+        round_method: Optional[str] = None,
+        approximate: bool = False,
+        sample_size: Optional[int] = 10000,
+    ) -> "StepScale":
+        """Splits the scale into a StepScale.
+        See `LinearColormap.to_step` for the description of the parameters.
+        """
+        msg = "You must specify either `index` or `n`"
+        if index is None:
+            if data is None:
+                if n is None:
+                    raise ValueError(msg)
+                else:
+                    index = [
+                        self.vmin + (self.vmax - self.vmin) * i * 1.0 / n
+                        for i in range(1 + n)
+                    ]
+                    scaled = self
+            elif method.lower().startswith(("jenks", "count", "head")):
+                _check_numpy()
+                values = _data_values(data)
+                if method.lower().startswith("head"):
+                    index = _head_tail_breaks(values, n)
+                elif n is None:
+                    raise ValueError(msg)
+                elif method.lower().startswith("jenks"):
+                    index = _jenks_breaks(values, n, sample_size=sample_size)
+                else:
+                    index = _equal_count_breaks(values, n)
+                scaled = self.scale(vmin=index[0], vmax=index[-1])
+            else:
+                method = "quantiles" if quantiles is not None else method
+                if method.lower().startswith("quant") and quantiles is None:
+                    if n is None:
+                        msg = "You must specify either `index`, `n` or" "`quantiles`."
+                        raise ValueError(msg)
+                    quantiles = [i * 1.0 / n for i in range(1 + n)]
+                if approximate:
+                    _check_numpy()
+                min_, max_, data_quantiles = _describe_data(
+                    data,
+                    quantiles if method.lower().startswith("quant") else None,
+                    approximate=approximate,
+                )
+                scaled = self.scale(vmin=min_, vmax=max_)
+                if method.lower().startswith("lin"):
+                    if n is None:
+                        raise ValueError(msg)
+                    index = [min_ + i * (max_ - min_) * 1.0 / n for i in range(1 + n)]
+                elif method.lower().startswith("log"):
+                    if n is None:
+                        raise ValueError(msg)
+                    if min_ <= 0:
+                        msg = "Log-scale works only with strictly " "positive values."
+                        raise ValueError(msg)
+                    index = [
+                        math.exp(
+                            math.log(min_)
+                            + i * (math.log(max_) - math.log(min_)) * 1.0 / n,
+                        )
+                        for i in range(1 + n)
+                    ]
+                elif method.lower().startswith("quant"):
+                    index = data_quantiles
+                else:
+                    raise ValueError(f"Unknown method {method}")
+        else:
+            scaled = self.scale(vmin=min(index), vmax=max(index))
+
+        n = len(index) - 1
+
+        if round_method == "int":
+            index = [round(x) for x in index]
+
+        if round_method == "log10":
+            index = [_base(x) for x in index]
+
+        if n == 1:
+            # A single class, like the breaks of constant data.
+            colors = [scaled.rgba_floats_tuple(index[0])]
+        else:
+            colors = [
+                scaled.rgba_floats_tuple(
+                    index[i] * (1.0 - i / (n - 1.0)) + index[i + 1] * i / (n - 1.0),
+                )
+                for i in range(n)
+            ]
+        _check_sorted(index)
+        return StepScale._from_parsed(
+            tuple(colors),
+            tuple(index),
+            index[0],
+            index[-1],
+        )
+
+    def to_colormap(self, **kwargs: Any) -> "LinearColormap":
+        """Wraps the scale into a LinearColormap, which can be rendered as a
+        legend. Keyword arguments like `caption` are passed to the colormap.
+        """
+        return LinearColormap._from_scale(self, **kwargs)
+
+
+class StepScale(ColorScale):
+    """An immutable color scale made of a set of colors, each one used
+    between two consecutive values of a given index.
+
+    See `StepColormap` for the description of the parameters.
+    """
+
+    __slots__ = ()
+
+    def __init__(
+        self,
+        colors: Sequence[TypeAnyColorType],
+        index: Optional[Sequence[float]] = None,
+        vmin: float = 0.0,
+        vmax: float = 1.0,
+    ):
+        n = len(colors)
+        if n < 1:
+            raise ValueError("You must provide at least 1 colors.")
+        if index is None:
+            index = [vmin + (vmax - vmin) * i * 1.0 / n for i in range(n + 1)]
+        _check_sorted(index)
+        self._set(tuple(_parse_colors(colors)), tuple(index), vmin, vmax)
+
+    def rgba_floats_tuple(self, x: float) -> TypeRGBAFloats:
+        """Provides the color corresponding to value `x` in the
+        form of a tuple (R,G,B,A) with float values between 0. and 1.
+        """
+        index, colors = self.index, self.colors
+        if x <= index[0]:
+            return colors[0]
+        if x >= index[-1]:
+            return colors[-1]
+
+        i = bisect_right(index, x)  # 0 < i < n.
+        return colors[i - 1]
+
+    def rgba_floats_array(self, x: Any) -> Any:
+        """Provides the colors corresponding to the values of the array `x`
+        in the form of an array of shape `x.shape + (4,)` with float values
+        between 0. and 1.
+        """
+        return self._get_arrays()[1][self._step_indices(x)]
+
+    def _step_indices(self, x: Any) -> Any:
+        """Provides the positions in `colors` of the colors corresponding to
+        the values of the array `x`, as an integer array of shape `x.shape`.
+        """
+        index, colors = self._get_arrays()
+        x = _as_float_array(x)
+
+        i = np.searchsorted(index, x, side="right")
+        out = np.clip(i - 1, 0, len(colors) - 1)
 
+        # In the order of `rgba_floats_tuple`, for an index of equal values.
+        out[x >= index[-1]] = len(colors) - 1
+        out[x <= index[0]] = 0
+        return out
 
-TypeRGBInts = Tuple[int, int, int]
-TypeRGBFloats = Tuple[float, float, float]
-TypeRGBAInts = Tuple[int, int, int, int]
-TypeRGBAFloats = Tuple[float, float, float, float]
-TypeAnyColorType = Union[TypeRGBInts, TypeRGBFloats, TypeRGBAInts, TypeRGBAFloats, str]
+    def to_linear(self, index: Optional[Sequence[float]] = None) -> LinearScale:
+        """Transforms the scale into a LinearScale.
+        See `StepColormap.to_linear` for the description of the parameters.
+        """
+        if index is None:
+            n = len(self.index) - 1
+            index = [
+                self.index[i] * (1.0 - i / (n - 1.0))
+                + self.index[i + 1] * i / (n - 1.0)
+                for i in range(n)
+            ]
 
+        if len(index) < 2:
+            raise ValueError("You must provide at least 2 colors.")
+        _check_sorted(index)
+        colors = tuple(self.rgba_floats_tuple(x) for x in index)
+        return LinearScale._from_parsed(colors, tuple(index), self.vmin, self.vmax)
 
-def _is_hex(x: str) -> bool:
-    return x.startswith("#") and len(x) == 7
+    def to_colormap(self, **kwargs: Any) -> "StepColormap":
+        """Wraps the scale into a StepColormap, which can be rendered as a
+        legend. Keyword arguments like `caption` are passed to the colormap.
+        """
+        return StepColormap._from_scale(self, **kwargs)
 
 
-def _parse_hex(color_code: str) -> TypeRGBAFloats:
-    return (
-        _color_int_to_float(int(color_code[1:3], 16)),
-        _color_int_to_float(int(color_code[3:5], 16)),
-        _color_int_to_float(int(color_code[5:7], 16)),
-        1.0,
-    )
+class _ObservedList(list):
+    """A list of `index` or `colors` of a ColorMap, which drops the lookup
+    tables of the colormap whenever it is modified in place.
 
+    It is pickled and copied as a plain list.
+    """
 
-def _color_int_to_float(x: int) -> float:
-    """Convert an integer between 0 and 255 to a float between 0. and 1.0"""
-    return x / 255.0
+    __slots__ = ("_owner",)
 
+    def __init__(self, values: Iterable[Any], owner: "ColorMap"):
+        super().__init__(values)
+        self._owner = owner
 
-def _color_float_to_int(x: float) -> int:
-    """Convert a float between 0. and 1.0 to an integer between 0 and 255"""
-    return int(x * 255.9999)
+    def __reduce__(self) -> tuple:
+        return (list, (list(self),))
 
 
-def _parse_color(x: Union[tuple, list, str]) -> TypeRGBAFloats:
-    if isinstance(x, (tuple, list)):
-        return tuple(tuple(x) + (1.0,))[:4]  # type: ignore
-    elif isinstance(x, str) and _is_hex(x):
-        return _parse_hex(x)
-    elif isinstance(x, str):
-        cname = _cnames.get(x.lower(), None)
-        if cname is None:
-            raise ValueError(f"Unknown color {cname!r}.")
-        return _parse_hex(cname)
-    else:
-        raise ValueError(f"Unrecognized color code {x!r}")
+def _observe(name: str) -> Callable:
+    method = getattr(list, name)
 
+    def observed(self: _ObservedList, *args: Any) -> Any:
+        result = method(self, *args)
+        self._owner._invalidate()
+        return result
 
-def _base(x: float) -> float:
-    if x > 0:
-        base = pow(10, math.floor(math.log10(x)))
-        return round(x / base) * base
-    else:
-        return 0
+    observed.__name__ = name
+    observed.__doc__ = method.__doc__
+    return observed
 
 
-class ColorMap(MacroElement):
+for _name in [
+    "__setitem__",
+    "__delitem__",
+    "__iadd__",
+    "__imul__",
+    "append",
+    "extend",
+    "insert",
+    "pop",
+    "remove",
+    "reverse",
+    "sort",
+    "clear",
+]:
+    setattr(_ObservedList, _name, _observe(_name))
+
+
+class ColorMap(_ColorMethods, MacroElement):
     """A generic class for creating colormaps.
 
     Parameters
@@ -92,9 +1281,21 @@ class ColorMap(MacroElement):
         The color for the text.
     max_labels : int, default 10
         Maximum number of legend tick labels
+
+    The number of colors sampled to draw the legend can be changed with the
+    `legend_samples` attribute (500 by default).
     """
 
     _template: Template = ENV.get_template("color_scale.js")
+    _scale_class: Optional[type] = None
+    # Whether the legend colors are interpolated in the browser between the
+    # stops given by `_legend_stops`, or drawn as the steps it gives.
+    _legend_interpolate = False
+    # Stored as tuples when shared with a ColorScale, and copied into lists
+    # the first time they are accessed. Those lists are `_ObservedList`, so
+    # that modifying them in place updates the colormap.
+    _index: Sequence[float]
+    _colors: Sequence[TypeRGBAFloats]
 
     def __init__(
         self,
@@ -107,23 +1308,55 @@ class ColorMap(MacroElement):
         super().__init__()
         self._name = "ColorMap"
 
+        self._cache_maxsize = 0
+        self._hex_cache: OrderedDict[Tuple[float, bool], str] = OrderedDict()
+        self._cache_hits = 0
+        self._cache_misses = 0
+        self._scale: Optional[ColorScale] = None
+
         self.vmin = vmin
         self.vmax = vmax
         self.caption = caption
         self.text_color = text_color
-        self.index: List[float] = [vmin, vmax]
+        self._colors = []
+        # A placeholder, not validated: `vmin` may be greater than `vmax`.
+        # Subclasses set the actual index.
+        self._index = [vmin, vmax]
+        self._invalidate()
         self.max_labels = max_labels
         self.tick_labels: Optional[Sequence[Union[float, str]]] = None
 
         self.width = 450
         self.height = 40
+        self.legend_samples = 500
+        self._legend_ramp: Optional[tuple] = None
+
+    def _legend_stops(self) -> Tuple[List[float], List[Any]]:
+        """The values and colors given to the legend template.
+
+        By default, `legend_samples` colors sampled between `vmin` and `vmax`,
+        each one drawn as a step. Subclasses can give fewer stops.
+        """
+        n = self.legend_samples
+        domain = [
+            float(self.vmin + (self.vmax - self.vmin) * k / (n - 1.0)) for k in range(n)
+        ]
+        return domain, [self.__call__(x) for x in domain]
+
+    def _get_legend_ramp(self) -> Tuple[List[float], List[Any]]:
+        """Computes the stops of the legend, reusing the previous ones as long
+        as the colormap is unchanged.
+        """
+        n = self.legend_samples
+        key = (self.vmin, self.vmax, tuple(self._index), tuple(self._colors), n)
+        if self._legend_ramp is None or self._legend_ramp[0] != key:
+            self._legend_ramp = (key,) + self._legend_stops()
+        return self._legend_ramp[1], self._legend_ramp[2]
 
     def render(self, **kwargs):
         """Renders the HTML representation of the element."""
-        self.color_domain = [
-            float(self.vmin + (self.vmax - self.vmin) * k / 499.0) for k in range(500)
-        ]
-        self.color_range = [self.__call__(x) for x in self.color_domain]
+        self.color_domain, self.color_range = self._get_legend_ramp()
+        self.legend_interpolate = self._legend_interpolate
 
         # sanitize possible numpy floats to native python floats
         self.index = [float(i) for i in self.index]
@@ -143,6 +1376,165 @@ class ColorMap(MacroElement):
             name="d3",
         )  # noqa
 
+    @property
+    def vmin(self) -> float:
+        """The left bound of the color scale."""
+        return self._vmin
+
+    @vmin.setter
+    def vmin(self, value: float):
+        self._vmin = value
+        self._scale = None
+        self._hex_cache.clear()
+
+    @property
+    def vmax(self) -> float:
+        """The right bound of the color scale."""
+        return self._vmax
+
+    @vmax.setter
+    def vmax(self, value: float):
+        self._vmax = value
+        self._scale = None
+        self._hex_cache.clear()
+
+    @property
+    def index(self) -> List[float]:
+        """The values corresponding to each color. It has to be sorted."""
+        if getattr(self._index, "_owner", None) is not self:
+            self._index = _ObservedList(self._index, self)
+        return self._index  # type: ignore
+
+    @index.setter
+    def index(self, value: Sequence[float]):
+        index = list(value)
+        _check_sorted(index)
+        changed = index != getattr(self, "_index", None)
+        self._index = index
+        if changed:
+            self._invalidate()
+
+    @property
+    def colors(self) -> List[TypeRGBAFloats]:
+        """The colors of the colormap, as RGBA float tuples."""
+        if getattr(self._colors, "_owner", None) is not self:
+            self._colors = _ObservedList(self._colors, self)
+        return self._colors  # type: ignore
+
+    @colors.setter
+    def colors(self, value: Sequence[TypeRGBAFloats]):
+        self._colors = list(value)
+        self._invalidate()
+
+    @classmethod
+    def _from_scale(
+        cls,
+        scale: ColorScale,
+        caption: str = "",
+        text_color: str = "black",
+        max_labels: int = 10,
+        tick_labels: Optional[Sequence[float]] = None,
+    ) -> Any:
+        """Creates a colormap wrapping `scale`, without parsing or validating
+        its colors and index again. The colormap shares the storage of the
+        scale until its `colors` or `index` are accessed.
+        """
+        self = cls.__new__(cls)
+        ColorMap.__init__(
+            self,
+            vmin=scale.vmin,
+            vmax=scale.vmax,
+            caption=caption,
+            text_color=text_color,
+            max_labels=max_labels,
+        )
+        self.tick_labels = tick_labels
+        self._index = scale.index
+        self._colors = scale.colors
+        self._scale = scale
+        return self
+
+    def _invalidate(self):
+        """Drop the lookup tables derived from `index` and `colors`."""
+        self._scale = None
+        self._luts: Dict[int, Any] = {}
+        self._hex_cache.clear()
+
+    def _lut_tables(self) -> Dict[int, Any]:
+        if self._scale_class is not None:
+            # Shared by the colormaps wrapping the same scale.
+            return self.color_scale._lut_tables()
+        return self._luts
+
+    @property
+    def color_scale(self) -> ColorScale:
+        """The immutable ColorScale computing the colors of this colormap."""
+        if self._scale_class is None:
+            raise NotImplementedError
+        if self._scale is None:
+            self._scale = self._scale_class._from_parsed(  # type: ignore
+                tuple(self._colors),
+                tuple(self._index),
+                self._vmin,
+                self._vmax,
+            )
+        return self._scale  # type: ignore
+
+    def enable_cache(self, maxsize: int = 4096) -> "ColorMap":
+        """Memoizes the hexadecimal colors computed by `__call__`,
+        `rgb_hex_str` and `rgba_hex_str`, keeping the `maxsize` most
+        recently used ones.
+
+        The cache is emptied whenever `vmin`, `vmax`, `index` or `colors`
+        are changed. Returns the colormap itself.
+        """
+        if maxsize < 1:
+            raise ValueError("The cache size must be a positive integer.")
+        self._cache_maxsize = maxsize
+        while len(self._hex_cache) > maxsize:
+            self._hex_cache.popitem(last=False)
+        return self
+
+    def disable_cache(self) -> "ColorMap":
+        """Stops memoizing hexadecimal colors and empties the cache."""
+        self._cache_maxsize = 0
+        self.cache_clear()
+        return self
+
+    def cache_info(self) -> CacheInfo:
+        """Returns the hits, misses, maximum and current size of the cache."""
+        return CacheInfo(
+            self._cache_hits,
+            self._cache_misses,
+            self._cache_maxsize,
+            len(self._hex_cache),
+        )
+
+    def cache_clear(self):
+        """Empties the cache and resets its statistics."""
+        self._hex_cache.clear()
+        self._cache_hits = 0
+        self._cache_misses = 0
+
+    def _cached_hex_str(self, x: float, alpha: bool) -> str:
+        key = (x, alpha)
+        try:
+            color = self._hex_cache[key]
+        except KeyError:
+            self._cache_misses += 1
+            rgba = self.rgba_bytes_tuple(x)
+            if alpha:
+                color = "#%02x%02x%02x%02x" % rgba
+            else:
+                color = "#%02x%02x%02x" % rgba[:3]
+            self._hex_cache[key] = color
+            if len(self._hex_cache) > self._cache_maxsize:
+                self._hex_cache.popitem(last=False)
+        else:
+            self._cache_hits += 1
+            self._hex_cache.move_to_end(key)
+        return color
+
     def rgba_floats_tuple(self, x: float) -> TypeRGBAFloats:
         """
         This class has to be implemented for each class inheriting from
@@ -153,35 +1545,59 @@ class ColorMap(MacroElement):
         """
         raise NotImplementedError
 
-    def rgba_bytes_tuple(self, x: float) -> TypeRGBAInts:
-        """Provides the color corresponding to value `x` in the
-        form of a tuple (R,G,B,A) with int values between 0 and 255.
-        """
-        return tuple(_color_float_to_int(u) for u in self.rgba_floats_tuple(x))  # type: ignore
-
-    def rgb_bytes_tuple(self, x: float) -> TypeRGBInts:
-        """Provides the color corresponding to value `x` in the
-        form of a tuple (R,G,B) with int values between 0 and 255.
-        """
-        return self.rgba_bytes_tuple(x)[:3]
-
     def rgb_hex_str(self, x: float) -> str:
         """Provides the color corresponding to value `x` in the
         form of a string of hexadecimal values "#RRGGBB".
         """
-        return "#%02x%02x%02x" % self.rgb_bytes_tuple(x)
+        if self._cache_maxsize:
+            return self._cached_hex_str(x, alpha=False)
+        return super().rgb_hex_str(x)
 
     def rgba_hex_str(self, x: float) -> str:
         """Provides the color corresponding to value `x` in the
         form of a string of hexadecimal values "#RRGGBBAA".
         """
-        return "#%02x%02x%02x%02x" % self.rgba_bytes_tuple(x)
-
-    def __call__(self, x: float) -> str:
-        """Provides the color corresponding to value `x` in the
-        form of a string of hexadecimal values "#RRGGBBAA".
+        if self._cache_maxsize:
+            return self._cached_hex_str(x, alpha=True)
+        return super().rgba_hex_str(x)
+
+    def rgba_floats_array(self, x: Any) -> Any:
+        """Provides the colors corresponding to the values of the array `x`
+        in the form of an array of shape `x.shape + (4,)` with float values
+        between 0. and 1.
+
+        This is the vectorized counterpart of `rgba_floats_tuple` and gives
+        the same results. Subclasses should override it, the default
+        implementation calls `rgba_floats_tuple` for each value.
         """
-        return self.rgba_hex_str(x)
+        _check_numpy()
+        x = _as_float_array(x)
+        out = np.empty(x.shape + (4,), dtype=float)
+        flat = out.reshape(-1, 4)
+        for k, value in enumerate(x.ravel().tolist()):
+            flat[k] = self.rgba_floats_tuple(value)
+        return out
+
+    def _svg_ramp(self) -> str:
+        """The colored band of `_repr_html_`, as SVG elements.
+
+        This default implementation draws one line per pixel. Subclasses
+        override it with a drawing that only depends on their index.
+        """
+        return "".join(
+            [
+                (
+                    '<line x1="{i}" y1="15" x2="{i}" '
+                    'y2="27" style="stroke:{color};stroke-width:2;" />'
+                ).format(
+                    i=i * 1,
+                    color=self.rgba_hex_str(
+                        self.vmin + (self.vmax - self.vmin) * i / (self.width - 1),
+                    ),
+                )
+                for i in range(self.width)
+            ],
+        )
 
     def _repr_html_(self) -> str:
         """Display the colormap in a Jupyter Notebook.
@@ -197,20 +1613,7 @@ class ColorMap(MacroElement):
 
         return (
             f'<svg height="40" width="{self.width}">'
-            + "".join(
-                [
-                    (
-                        '<line x1="{i}" y1="15" x2="{i}" '
-                        'y2="27" style="stroke:{color};stroke-width:2;" />'
-                    ).format(
-                        i=i * 1,
-                        color=self.rgba_hex_str(
-                            self.vmin + (self.vmax - self.vmin) * i / (self.width - 1),
-                        ),
-                    )
-                    for i in range(self.width)
-                ],
-            )
+            + self._svg_ramp()
             + (
                 '<text x="0" y="38" style="text-anchor:start; font-size:11px;'
                 ' font:Arial; fill:{}">{}</text>'
@@ -257,8 +1660,9 @@ class LinearColormap(ColorMap):
         `(255, 255, 0, 255)`)
         * tuples of RGBA floats between 0. and 1. (e.g: `(1.,1.,0.)` or
         `(1., 1., 0., 1.)`)
-        * HTML-like string (e.g: `"#ffff00`)
+        * HTML-like string (e.g: `"#ffff00"`, `"#ff0"` or `"#ffff0080"`)
         * a color name or shortcut (e.g: `"y"` or `"yellow"`)
+        A NumPy array of shape (N, 3) or (N, 4) is also accepted.
     index : list of floats, default None
         The values corresponding to each color.
         It has to be sorted, and have the same length as `colors`.
@@ -278,6 +1682,9 @@ class LinearColormap(ColorMap):
     tick_labels: list of floats, default None
         If given, used as the positions of ticks."""
 
+    _scale_class = LinearScale
+    _legend_interpolate = True
+
     def __init__(
         self,
         colors: Sequence[TypeAnyColorType],
@@ -305,38 +1712,76 @@ class LinearColormap(ColorMap):
             self.index = [vmin + (vmax - vmin) * i * 1.0 / (n - 1) for i in range(n)]
         else:
             self.index = list(index)
-        self.colors: List[TypeRGBAFloats] = [_parse_color(x) for x in colors]
+        self.colors = _parse_colors(colors)
 
     def rgba_floats_tuple(self, x: float) -> TypeRGBAFloats:
         """Provides the color corresponding to value `x` in the
         form of a tuple (R,G,B,A) with float values between 0. and 1.
         """
-        if x <= self.index[0]:
-            return self.colors[0]
-        if x >= self.index[-1]:
-            return self.colors[-1]
+        return self.color_scale.rgba_floats_tuple(x)
 
-        i = len([u for u in self.index if u < x])  # 0 < i < n.
-        if self.index[i - 1] < self.index[i]:
-            p = (x - self.index[i - 1]) * 1.0 / (self.index[i] - self.index[i - 1])
-        elif self.index[i - 1] == self.index[i]:
-            p = 1.0
-        else:
-            raise ValueError("Thresholds are not sorted.")
+    def rgba_floats_array(self, x: Any) -> Any:
+        """Provides the colors corresponding to the values of the array `x`
+        in the form of an array of shape `x.shape + (4,)` with float values
+        between 0. and 1.
+        """
+        return self.color_scale.rgba_floats_array(x)
 
-        return tuple(  # type: ignore
-            (1.0 - p) * self.colors[i - 1][j] + p * self.colors[i][j] for j in range(4)
+    def _stops(self) -> List[Tuple[float, TypeRGBAFloats]]:
+        """The colors of `vmin`, of the index values between `vmin` and
+        `vmax`, and of `vmax`. The colormap is linear between two consecutive
+        stops. Repeated index values give a sharp change of color.
+        """
+        stops = [(self.vmin, self.rgba_floats_tuple(self.vmin))]
+        stops += [
+            (x, color)
+            for x, color in zip(self.index, self.colors)
+            if self.vmin < x < self.vmax
+        ]
+        stops.append((self.vmax, self.rgba_floats_tuple(self.vmax)))
+        return stops
+
+    def _legend_stops(self) -> Tuple[List[float], List[Any]]:
+        """The values of `_stops` and their RGBA colors as lists of floats,
+        interpolated in the browser.
+        """
+        stops = self._stops()
+        return (
+            [float(x) for x, _ in stops],
+            [[float(u) for u in color] for _, color in stops],
+        )
+
+    def _svg_ramp(self) -> str:
+        """The colored band of `_repr_html_`, as an SVG gradient with one stop
+        per index value between `vmin` and `vmax`.
+        """
+        if not self.vmin < self.vmax:
+            return super()._svg_ramp()
+        gradient_id = self.get_name() + "_gradient"
+        stops = "".join(
+            '<stop offset="{:g}" stop-color="#{:02x}{:02x}{:02x}{:02x}" />'.format(
+                (x - self.vmin) / (self.vmax - self.vmin),
+                *(_color_float_to_int(u) for u in color),
+            )
+            for x, color in self._stops()
+        )
+        return (
+            f'<defs><linearGradient id="{gradient_id}">{stops}</linearGradient>'
+            f'</defs><rect x="-1" y="15" width="{self.width + 1}" height="12" '
+            f'style="fill:url(#{gradient_id});" />'
         )
 
     def to_step(
         self,
         n: Optional[int] = None,
         index: Optional[Sequence[float]] = None,
-        data: Optional[Sequence[float]] = None,
+        data: Any = None,
         method: str = "linear",
         quantiles: Optional[Sequence[float]] = None,
         round_method: Optional[str] = None,
         max_labels: int = 10,
+        approximate: bool = False,
+        sample_size: Optional[int] = 10000,
     ) -> "StepColormap":
         """Splits the LinearColormap into a StepColormap.
 
@@ -349,12 +1794,21 @@ class LinearColormap(ColorMap):
             The values corresponding to each color bounds.
             It has to be sorted.
             If None, a regular grid between `vmin` and `vmax` is created.
-        data : list of floats, default None
-            A sample of data to adapt the color map to.
+        data : list of floats, array or iterable of arrays, default None
+            A sample of data to adapt the color map to. With NumPy installed,
+            it can also be an iterable of chunks (lists or arrays), and NaN
+            values are ignored.
         method : str, default 'linear'
             The method used to create data-based colormap.
             It can be 'linear' for linear scale, 'log' for logarithmic,
             or 'quant' for data's quantile-based scale.
+            With NumPy installed, it can also be:
+            * 'jenks' for Fisher-Jenks natural breaks, that minimize the
+            variance within each class.
+            * 'count' for classes holding the same number of values, with
+            thresholds on actual data values.
+            * 'headtail' for head/tail breaks, suited to heavy-tailed data.
+            `n` is then the maximum number of classes, and is optional.
         quantiles : list of floats, default None
             Alternatively, you can provide explicitly the quantiles you
             want to use in the scale.
@@ -366,6 +1820,14 @@ class LinearColormap(ColorMap):
             2000, 2790 to 3000.
         max_labels : int, default 10
             Maximum number of legend tick labels
+        approximate : bool, default False
+            If True, quantiles of `data` are estimated with a bounded-memory
+            sketch, so that `data` can be streamed in chunks and doesn't have
+            to fit in memory. Requires NumPy.
+        sample_size : int, default 10000
+            With method 'jenks', the maximum number of values the breaks are
+            computed on. Larger data are randomly sampled. If None, all values
+            are used, which is slow for large data.
 
         Returns
         -------
@@ -381,87 +1843,25 @@ class LinearColormap(ColorMap):
         >> lc.to_step(data=some_list, quantiles=[0, 0.3, 0.7, 1])
         >> lc.to_step(data=some_list, quantiles=[0, 0.3, 0.7, 1],
         ...           round_method='log10')
+        >> lc.to_step(data=(chunk for chunk in chunks), n=12,
+        ...           method='quantiles', approximate=True)
+        >> lc.to_step(data=some_array, n=7, method='jenks')
+        >> lc.to_step(data=some_array, method='headtail')
 
         """
-        msg = "You must specify either `index` or `n`"
-        if index is None:
-            if data is None:
-                if n is None:
-                    raise ValueError(msg)
-                else:
-                    index = [
-                        self.vmin + (self.vmax - self.vmin) * i * 1.0 / n
-                        for i in range(1 + n)
-                    ]
-                    scaled_cm = self
-            else:
-                max_ = max(data)
-                min_ = min(data)
-                scaled_cm = self.scale(vmin=min_, vmax=max_)
-                method = "quantiles" if quantiles is not None else method
-                if method.lower().startswith("lin"):
-                    if n is None:
-                        raise ValueError(msg)
-                    index = [min_ + i * (max_ - min_) * 1.0 / n for i in range(1 + n)]
-                elif method.lower().startswith("log"):
-                    if n is None:
-                        raise ValueError(msg)
-                    if min_ <= 0:
-                        msg = "Log-scale works only with strictly " "positive values."
-                        raise ValueError(msg)
-                    index = [
-                        math.exp(
-                            math.log(min_)
-                            + i * (math.log(max_) - math.log(min_)) * 1.0 / n,
-                        )
-                        for i in range(1 + n)
-                    ]
-                elif method.lower().startswith("quant"):
-                    if quantiles is None:
-                        if n is None:
-                            msg = (
-                                "You must specify either `index`, `n` or" "`quantiles`."
-                            )
-                            raise ValueError(msg)
-                        else:
-                            quantiles = [i * 1.0 / n for i in range(1 + n)]
-                    p = len(data) - 1
-                    s = sorted(data)
-                    index = [
-                        s[int(q * p)] * (1.0 - (q * p) % 1)
-                        + s[min(int(q * p) + 1, p)] * ((q * p) % 1)
-                        for q in quantiles
-                    ]
-                else:
-                    raise ValueError(f"Unknown method {method}")
-        else:
-            scaled_cm = self.scale(vmin=min(index), vmax=max(index))
-
-        n = len(index) - 1
-
-        if round_method == "int":
-            index = [round(x) for x in index]
-
-        if round_method == "log10":
-            index = [_base(x) for x in index]
-
-        colors = [
-            scaled_cm.rgba_floats_tuple(
-                index[i] * (1.0 - i / (n - 1.0)) + index[i + 1] * i / (n - 1.0),
-            )
-            for i in range(n)
-        ]
-
-        caption = self.caption
-        text_color = self.text_color
-
-        return StepColormap(
-            colors,
+        step = self.color_scale.to_step(  # type: ignore
+            n=n,
             index=index,
-            vmin=index[0],
-            vmax=index[-1],
-            caption=caption,
-            text_color=text_color,
+            data=data,
+            method=method,
+            quantiles=quantiles,
+            round_method=round_method,
+            approximate=approximate,
+            sample_size=sample_size,
+        )
+        return step.to_colormap(
+            caption=self.caption,
+            text_color=self.text_color,
             max_labels=max_labels,
             tick_labels=self.tick_labels,
         )
@@ -475,14 +1875,7 @@ class LinearColormap(ColorMap):
         """Transforms the colorscale so that the minimal and maximal values
         fit the given parameters.
         """
-        return LinearColormap(
-            self.colors,
-            index=[
-                vmin + (vmax - vmin) * (x - self.vmin) * 1.0 / (self.vmax - self.vmin)
-                for x in self.index
-            ],  # noqa
-            vmin=vmin,
-            vmax=vmax,
+        return self.color_scale.scale(vmin, vmax).to_colormap(
             caption=self.caption,
             text_color=self.text_color,
             max_labels=max_labels,
@@ -502,8 +1895,9 @@ class StepColormap(ColorMap):
         `(255, 255, 0, 255)`)
         * tuples of floats between 0. and 1. (e.g: `(1.,1.,0.)` or
         `(1., 1., 0., 1.)`)
-        * HTML-like string (e.g: `"#ffff00`)
+        * HTML-like string (e.g: `"#ffff00"`, `"#ff0"` or `"#ffff0080"`)
         * a color name or shortcut (e.g: `"y"` or `"yellow"`)
+        A NumPy array of shape (N, 3) or (N, 4) is also accepted.
     index : list of floats, default None
         The bounds of the colors. The lower value is inclusive,
         the upper value is exclusive.
@@ -525,6 +1919,8 @@ class StepColormap(ColorMap):
         If given, used as the positions of ticks.
     """
 
+    _scale_class = StepScale
+
     def __init__(
         self,
         colors: Sequence[TypeAnyColorType],
@@ -552,7 +1948,7 @@ class StepColormap(ColorMap):
             self.index = [vmin + (vmax - vmin) * i * 1.0 / n for i in range(n + 1)]
         else:
             self.index = list(index)
-        self.colors: List[TypeRGBAFloats] = [_parse_color(x) for x in colors]
+        self.colors = _parse_colors(colors)
 
     def rgba_floats_tuple(self, x: float) -> TypeRGBAFloats:
         """
@@ -560,13 +1956,58 @@ class StepColormap(ColorMap):
         form of a tuple (R,G,B,A) with float values between 0. and 1.
 
         """
-        if x <= self.index[0]:
-            return self.colors[0]
-        if x >= self.index[-1]:
-            return self.colors[-1]
+        return self.color_scale.rgba_floats_tuple(x)
+
+    def rgba_floats_array(self, x: Any) -> Any:
+        """Provides the colors corresponding to the values of the array `x`
+        in the form of an array of shape `x.shape + (4,)` with float values
+        between 0. and 1.
+        """
+        return self.color_scale.rgba_floats_array(x)
 
-        i = len([u for u in self.index if u <= x])  # 0 < i < n.
-        return self.colors[i - 1]
+    def _steps(self) -> List[Tuple[float, float, str]]:
+        """The steps drawn between `vmin` and `vmax`, as tuples
+        (lower bound, upper bound, "#RRGGBBAA" color).
+        """
+        index, colors = self.index, self.colors
+        bounds = [-math.inf] + list(index) + [math.inf]
+        bins = [colors[0]] + [
+            colors[min(k, len(colors) - 1)] for k in range(len(index))
+        ]
+        steps = []
+        for lower, upper, color in zip(bounds[:-1], bounds[1:], bins):
+            lower, upper = max(lower, self.vmin), min(upper, self.vmax)
+            if lower < upper:
+                hex_color = "#%02x%02x%02x%02x" % tuple(
+                    _color_float_to_int(u) for u in color
+                )
+                steps.append((lower, upper, hex_color))
+        return steps
+
+    def _legend_stops(self) -> Tuple[List[float], List[Any]]:
+        """The thresholds between the steps and the colors of the steps."""
+        steps = self._steps()
+        if not steps:
+            return super()._legend_stops()
+        return [float(upper) for _, upper, _ in steps[:-1]], [c for _, _, c in steps]
+
+    def _svg_ramp(self) -> str:
+        """The colored band of `_repr_html_`, as one SVG rectangle per step."""
+        if not self.vmin < self.vmax:
+            return super()._svg_ramp()
+        rects = []
+        for lower, upper, color in self._steps():
+            x = (lower - self.vmin) * self.width / (self.vmax - self.vmin)
+            width = (upper - lower) * self.width / (self.vmax - self.vmin)
+            rects.append(
+                '<rect x="{:g}" y="15" width="{:g}" height="12" '
+                'style="fill:{};" />'.format(
+                    x - 1 if lower == self.vmin else x,
+                    width + 1 if lower == self.vmin else width,
+                    color,
+                ),
+            )
+        return "".join(rects)
 
     def to_linear(
         self,
@@ -586,20 +2027,7 @@ class StepColormap(ColorMap):
             Maximum number of legend tick labels
 
         """
-        if index is None:
-            n = len(self.index) - 1
-            index = [
-                self.index[i] * (1.0 - i / (n - 1.0))
-                + self.index[i + 1] * i / (n - 1.0)
-                for i in range(n)
-            ]
-
-        colors = [self.rgba_floats_tuple(x) for x in index]
-        return LinearColormap(
-            colors,
-            index=index,
-            vmin=self.vmin,
-            vmax=self.vmax,
+        return self.color_scale.to_linear(index).to_colormap(  # type: ignore
             caption=self.caption,
             text_color=self.text_color,
             max_labels=max_labels,
@@ -614,28 +2042,203 @@ class StepColormap(ColorMap):
         """Transforms the colorscale so that the minimal and maximal values
         fit the given parameters.
         """
-        return StepColormap(
-            self.colors,
-            index=[
-                vmin + (vmax - vmin) * (x - self.vmin) * 1.0 / (self.vmax - self.vmin)
-                for x in self.index
-            ],  # noqa
-            vmin=vmin,
-            vmax=vmax,
+        return self.color_scale.scale(vmin, vmax).to_colormap(
             caption=self.caption,
             text_color=self.text_color,
             max_labels=max_labels,
         )
 
 
-class _LinearColormaps:
-    """A class for hosting the list of built-in linear colormaps."""
+class SharedColorLUT:
+    """A lookup table of colors stored in shared memory, so that several
+    processes can color values through the same table without copying it.
 
-    def __init__(self):
-        self._schemes = _schemes.copy()
-        self._colormaps = {key: LinearColormap(val) for key, val in _schemes.items()}
-        for key, val in _schemes.items():
-            setattr(self, key, LinearColormap(val))
+    Publish the table of a colormap once in the main process with
+    `SharedColorLUT.publish(colormap, n)`, then pass it to the worker
+    processes, for instance as an argument of a process pool task. It is
+    pickled as the name of its shared memory block, and workers attach to that
+    block read-only instead of rebuilding the colormap.
+
+    The process which published the table has to `unlink` it when the
+    workers are done with it, which happens when leaving a ``with`` block.
+
+    Parameters
+    ----------
+    shm : multiprocessing.shared_memory.SharedMemory
+        The shared memory block holding the table.
+    n : int
+        The number of colors in the table.
+    vmin : float
+        The value of the first color of the table.
+    vmax : float
+        The value of the last color of the table.
+    owner : bool, default False
+        Whether this object created the shared memory block.
+    """
+
+    def __init__(
+        self,
+        shm: Any,
+        n: int,
+        vmin: float,
+        vmax: float,
+        owner: bool = False,
+    ):
+        _check_numpy()
+        self._shm = shm
+        self._owner = owner
+        self.n = n
+        self.vmin = vmin
+        self.vmax = vmax
+        self.table: Any = self._view()
+
+    def _view(self) -> Any:
+        """A read-only array viewing the table in the shared memory block.
+        It holds an export of the buffer of the block, so that the block
+        cannot be closed while the array or arrays derived from it are used.
+        """
+        table = np.frombuffer(self._shm.buf, dtype=np.uint8, count=4 * self.n)
+        table = table.reshape(self.n, 4)
+        table.flags.writeable = False
+        return table
+
+    @classmethod
+    def publish(cls, colormap: Any, n: int = 256) -> "SharedColorLUT":
+        """Copies the table of `n` colors of `colormap`, a ColorMap or a
+        ColorScale, into a new shared memory block.
+        """
+        from multiprocessing import shared_memory
+
+        table = colormap.to_lut(n)
+        shm = shared_memory.SharedMemory(create=True, size=table.nbytes)
+        np.ndarray(table.shape, dtype=np.uint8, buffer=shm.buf)[:] = table
+        return cls(shm, n, colormap.index[0], colormap.index[-1], owner=True)
+
+    @classmethod
+    def attach(cls, name: str, n: int, vmin: float, vmax: float) -> "SharedColorLUT":
+        """Attaches to the table published under the shared memory block
+        `name`.
+        """
+        from multiprocessing import shared_memory
+
+        if sys.version_info >= (3, 13):
+            # Only the publishing process is in charge of removing the block.
+            shm = shared_memory.SharedMemory(name=name, track=False)
+        else:
+            shm = shared_memory.SharedMemory(name=name)
+        return cls(shm, n, vmin, vmax)
+
+    @property
+    def name(self) -> str:
+        """The name of the shared memory block."""
+        return self._shm.name
+
+    @property
+    def index(self) -> Tuple[float, float]:
+        """The values of the first and last colors of the table."""
+        return (self.vmin, self.vmax)
+
+    def __reduce__(self) -> tuple:
+        return (type(self).attach, (self.name, self.n, self.vmin, self.vmax))
+
+    def __repr__(self) -> str:
+        return (
+            f"{type(self).__name__}(name={self.name!r}, n={self.n}, "
+            f"vmin={self.vmin!r}, vmax={self.vmax!r})"
+        )
+
+    def to_lut(self, n: int) -> Any:
+        """Returns the table, which has to have `n` colors."""
+        if n != self.n:
+            raise ValueError(f"The shared table has {self.n} colors, not {n}.")
+        return self.table
+
+    def rgba_bytes_array(
+        self,
+        x: Any,
+        out: Any = None,
+        missing: Optional[TypeAnyColorType] = None,
+        workers: Optional[int] = None,
+    ) -> Any:
+        """Provides the colors corresponding to the values of the array `x`
+        in the form of a uint8 array of shape `x.shape + (4,)`, looked up in
+        the table. See `ColorMap.rgba_bytes_array` for the parameters.
+        """
+        return _rgba_bytes_array(
+            self,
+            x,
+            lut=self.n,
+            out=out,
+            missing=missing,
+            workers=workers,
+        )
+
+    def rgba_hex_array(
+        self,
+        x: Any,
+        missing: Optional[TypeAnyColorType] = None,
+    ) -> Any:
+        """Provides the colors corresponding to the values of the array `x`
+        in the form of an array of strings "#RRGGBBAA".
+        """
+        return hex_encode(self.rgba_bytes_array(x, missing=missing))
+
+    def close(self):
+        """Closes the access to the shared memory block from this process.
+        The table cannot be used anymore.
+
+        Raises BufferError if arrays viewing the table, like the one returned
+        by `to_lut`, are still referenced. They stay valid, and `close` can be
+        called again once they are released.
+        """
+        self.table = None
+        self._shm.close()
+
+    def unlink(self):
+        """Requests the removal of the shared memory block. It is freed once
+        every process has closed it.
+        """
+        self._shm.unlink()
+
+    def __enter__(self) -> "SharedColorLUT":
+        return self
+
+    def __exit__(self, *args: Any):
+        try:
+            self.close()
+        finally:
+            if self._owner:
+                self.unlink()
+
+
+class _Colormaps:
+    """A base class for hosting a list of built-in colormaps.
+
+    The colormaps are only built when they are first accessed.
+    """
+
+    _colormap_class: type = ColorMap
+
+    @property
+    def _schemes(self) -> Dict[str, List[str]]:
+        return {key: list(codes) for key, codes in _get_schemes().items()}
+
+    def __getattr__(self, key: str) -> ColorMap:
+        # Only called when the colormap has not been built yet.
+        if key.startswith("__") or key not in _get_schemes():
+            raise AttributeError(
+                f"{type(self).__name__!r} object has no attribute {key!r}",
+            )
+        colormap = self._colormap_class(_get_scheme_colors(key))
+        setattr(self, key, colormap)
+        return colormap
+
+    def __dir__(self) -> List[str]:
+        return sorted(set(super().__dir__()) | set(_get_schemes()))
+
+    @property
+    def _colormaps(self) -> Dict[str, ColorMap]:
+        return {key: getattr(self, key) for key in _get_schemes()}
 
     def _repr_html_(self) -> str:
         return Template(
@@ -648,27 +2251,19 @@ class _LinearColormaps:
         ).render(this=self)
 
 
+class _LinearColormaps(_Colormaps):
+    """A class for hosting the list of built-in linear colormaps."""
+
+    _colormap_class = LinearColormap
+
+
 linear = _LinearColormaps()
 
 
-class _StepColormaps:
+class _StepColormaps(_Colormaps):
     """A class for hosting the list of built-in step colormaps."""
 
-    def __init__(self):
-        self._schemes = _schemes.copy()
-        self._colormaps = {key: StepColormap(val) for key, val in _schemes.items()}
-        for key, val in _schemes.items():
-            setattr(self, key, StepColormap(val))
-
-    def _repr_html_(self) -> str:
-        return Template(
-            """
-        <table>
-        {% for key,val in this._colormaps.items() %}
-        <tr><td>{{key}}</td><td>{{val._repr_html_()}}</td></tr>
-        {% endfor %}</table>
-        """,
-        ).render(this=self)
+    _colormap_class = StepColormap
 
 
 step = _StepColormaps()
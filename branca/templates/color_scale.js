@@ -1,18 +1,35 @@
 {% macro script(this, kwargs) %}
     var {{this.get_name()}} = {};
 
-    {%if this.color_range %}
+    {%if this.color_range and this.legend_interpolate %}
+    {{this.get_name()}}.color = (function(stops, colors, n) {
+        // Samples n colors between the stops, interpolating linearly.
+        var domain = [], range = [], last = stops.length - 1;
+        for (var k = 0; k < n; k++) {
+            var x = stops[0] + (stops[last] - stops[0]) * k / (n - 1),
+                i = Math.min(Math.max(d3.bisectLeft(stops, x), 1), last),
+                width = stops[i] - stops[i - 1],
+                p = x <= stops[0] ? 0 : (x >= stops[last] || width <= 0) ? 1 : (x - stops[i - 1]) / width;
+            domain.push(x);
+            range.push("#" + [0, 1, 2, 3].map(function(j) {
+                var c = Math.floor(((1 - p) * colors[i - 1][j] + p * colors[i][j]) * 255.9999);
+                return (c < 16 ? "0" : "") + c.toString(16);
+            }).join(""));
+        }
+        return d3.scale.threshold().domain(domain).range(range);
+    })({{this.color_domain}}, {{this.color_range}}, {{this.legend_samples}});
+    {%elif this.color_range %}
     {{this.get_name()}}.color = d3.scale.threshold()
               .domain({{this.color_domain}})
               .range({{this.color_range}});
     {%else%}
     {{this.get_name()}}.color = d3.scale.threshold()
-              .domain([{{ this.color_domain[0] }}, {{ this.color_domain[-1] }}])
+              .domain([{{ this.vmin|float }}, {{ this.vmax|float }}])
               .range(['{{ this.fill_color }}', '{{ this.fill_color }}']);
     {%endif%}
 
     {{this.get_name()}}.x = d3.scale.linear()
-              .domain([{{ this.color_domain[0] }}, {{ this.color_domain[-1] }}])
+              .domain([{{ this.vmin|float }}, {{ this.vmax|float }}])
               .range([0, {{ this.width }} - 50]);
 
     {{this.get_name()}}.legend = L.control({position: 'topright'});
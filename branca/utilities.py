@@ -7,6 +7,8 @@ Utility module for Folium helper functions.
 """
 
 import base64
+import io
+import itertools
 import json
 import math
 import os
@@ -14,7 +16,19 @@ import re
 import struct
 import typing
 import zlib
-from typing import Any, Callable, List, Optional, Sequence, Tuple, Union
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
 
 from jinja2 import Environment, PackageLoader
 
@@ -33,6 +47,15 @@ rootpath: str = os.path.abspath(os.path.dirname(__file__))
 TypeParseSize = Union[int, float, str, Tuple[float, str]]
 
 
+@lru_cache(maxsize=None)
+def _load_json(filename: str) -> Any:
+    """Loads a JSON data file shipped with branca, once per process.
+    The object returned is shared and must not be modified.
+    """
+    with open(os.path.join(rootpath, filename)) as f:
+        return json.loads(f.read())
+
+
 def get_templates() -> Environment:
     """Get Jinja templates."""
     return Environment(loader=PackageLoader("branca", "templates"))
@@ -60,54 +83,81 @@ def legend_scaler(
     return legend_ticks
 
 
+def _linear_gradient_bytes(hexList: List[str], nColors: int) -> List[List[int]]:
+    """
+    Computes the (r, g, b) int values of `linear_gradient`.
+
+    Each pair of consecutive colors is conceptually interpolated over 765
+    steps, and nColors of all those steps are picked at regular intervals.
+    Only the picked steps are actually computed.
+    """
+    nInterpolate = 765
+    colors = [
+        [int(code[1:3], 16), int(code[3:5], 16), int(code[5:7], 16)] for code in hexList
+    ]
+    nTotal = nInterpolate * (len(colors) - 1)
+
+    result = []
+    for counter in range(nColors):
+        fraction = float(counter) / (nColors - 1)
+        pair, step = divmod(int(fraction * (nTotal - 1)), nInterpolate)
+        start, end = colors[pair], colors[pair + 1]
+        fraction = float(step) / (nInterpolate - 1)
+        result.append(
+            [int(start[k] + fraction * (end[k] - start[k])) for k in range(3)],
+        )
+    return result
+
+
 def linear_gradient(hexList: List[str], nColors: int) -> List[str]:
     """
     Given a list of hexcode values, will return a list of length
     nColors where the colors are linearly interpolated between the
     (r, g, b) tuples that are given.
     """
+    return [
+        "#%02x%02x%02x" % tuple(color)
+        for color in _linear_gradient_bytes(hexList, nColors)
+    ]
 
-    def _scale(start, finish, length, i):
-        """
-        Return the value correct value of a number that is in between start
-        and finish, for use in a loop of length *length*.
-
-        """
-        base = 16
-
-        fraction = float(i) / (length - 1)
-        raynge = int(finish, base) - int(start, base)
-        thex = hex(int(int(start, base) + fraction * raynge)).split("x")[-1]
-        if len(thex) != 2:
-            thex = "0" + thex
-        return thex
-
-    allColors: List[str] = []
-    # Separate (R, G, B) pairs.
-    for start, end in zip(hexList[:-1], hexList[1:]):
-        # Linearly interpolate between pair of hex ###### values and
-        # add to list.
-        nInterpolate = 765
-        for index in range(nInterpolate):
-            r = _scale(start[1:3], end[1:3], nInterpolate, index)
-            g = _scale(start[3:5], end[3:5], nInterpolate, index)
-            b = _scale(start[5:7], end[5:7], nInterpolate, index)
-            allColors.append("".join(["#", r, g, b]))
-
-    # Pick only nColors colors from the total list.
-    result: List[str] = []
-    for counter in range(nColors):
-        fraction = float(counter) / (nColors - 1)
-        index = int(fraction * (len(allColors) - 1))
-        result.append(allColors[index])
-    return result
 
+def linear_gradient_rgba(hexList: List[str], nColors: int) -> Any:
+    """
+    Same as `linear_gradient`, but returns the colors as a uint8 NumPy
+    array of shape (nColors, 4), with an opaque alpha channel.
+    """
+    if np is None:
+        raise ImportError("The NumPy package is required for this functionality")
+    colors = np.full((nColors, 4), 255, dtype=np.uint8)
+    colors[:, :3] = np.array(_linear_gradient_bytes(hexList, nColors)).reshape(-1, 3)
+    return colors
 
-def color_brewer(color_code: str, n: int = 6) -> List[str]:
+
+@lru_cache(maxsize=None)
+def _get_brewer_index() -> Dict[str, Tuple[List[int], str]]:
+    """For each ColorBrewer base code, the sorted sizes of its explicit
+    schemes and the name of the longest one.
+    """
+    sizes: Dict[str, List[int]] = {}
+    for name in _load_json("_schemes.json"):
+        if "_" not in name:
+            continue
+        base_code, size = name.split("_", 1)
+        sizes.setdefault(base_code, []).append(int(size))
+    index = {}
+    for base_code, values in sizes.items():
+        values.sort()
+        index[base_code] = (values, base_code + "_" + str(values[-1]).zfill(2))
+    return index
+
+
+def color_brewer(color_code: str, n: int = 6) -> Tuple[str, ...]:
     """
     Generate a colorbrewer color scheme of length 'len', type 'scheme.
     Live examples can be seen at http://colorbrewer2.org/
 
+    The result is cached, and returned as a tuple so it can't be modified.
+
     """
     maximum_n = 253
     minimum_n = 3
@@ -129,81 +179,61 @@ def color_brewer(color_code: str, n: int = 6) -> List[str]:
 
     if not isinstance(color_code, str):
         raise ValueError(f"color should be a string, not a {type(color_code)}.")
+    return _color_brewer(color_code, n)
+
+
+@lru_cache(maxsize=None)
+def _color_brewer(color_code: str, n: int) -> Tuple[str, ...]:
     if color_code[-2:] == "_r":
         base_code = color_code[:-2]
-        core_color_code = base_code + "_" + str(n).zfill(2)
         color_reverse = True
     else:
         base_code = color_code
-        core_color_code = base_code + "_" + str(n).zfill(2)
         color_reverse = False
+    core_color_code = base_code + "_" + str(n).zfill(2)
 
-    with open(os.path.join(rootpath, "_schemes.json")) as f:
-        schemes = json.loads(f.read())
-
-    with open(os.path.join(rootpath, "scheme_info.json")) as f:
-        scheme_info = json.loads(f.read())
-
-    with open(os.path.join(rootpath, "scheme_base_codes.json")) as f:
-        core_schemes = json.loads(f.read())["codes"]
-
-    if base_code not in core_schemes:
+    schemes = _load_json("_schemes.json")
+    if base_code not in _load_json("scheme_base_codes.json")["codes"]:
         raise ValueError(base_code + " is not a valid ColorBrewer code")
 
-    explicit_scheme = True
-    if schemes.get(core_color_code) is None:
-        explicit_scheme = False
-
+    color_scheme = schemes.get(core_color_code)
     # Only if n is greater than the scheme length do we interpolate values.
-    if not explicit_scheme:
+    if color_scheme is None:
+        # Schemes without explicit sizes, like viridis, are stored whole.
+        sizes, longest_scheme_name = _get_brewer_index().get(
+            base_code,
+            ([], base_code),
+        )
         # Check to make sure that it is not a qualitative scheme.
-        if scheme_info[base_code] == "Qualitative":
-            matching_quals = []
-            for key in schemes:
-                if base_code + "_" in key:
-                    matching_quals.append(int(key.split("_")[1]))
-
+        if _load_json("scheme_info.json")[base_code] == "Qualitative":
             raise ValueError(
                 "Expanded color support is not available"
                 " for Qualitative schemes; restrict the"
                 " number of colors for the "
                 + base_code
                 + " code to between "
-                + str(min(matching_quals))
+                + str(sizes[0])
                 + " and "
-                + str(max(matching_quals)),
+                + str(sizes[-1]),
             )
-        else:
-            longest_scheme_name = base_code
-            longest_scheme_n = 0
-            for sn_name in schemes.keys():
-                if "_" not in sn_name:
-                    continue
-                if sn_name.split("_")[0] != base_code:
-                    continue
-                if int(sn_name.split("_")[1]) > longest_scheme_n:
-                    longest_scheme_name = sn_name
-                    longest_scheme_n = int(sn_name.split("_")[1])
-
-            if not color_reverse:
-                color_scheme = linear_gradient(schemes.get(longest_scheme_name), n)
-            else:
-                color_scheme = linear_gradient(
-                    schemes.get(longest_scheme_name)[::-1],
-                    n,
-                )
-    else:
-        if not color_reverse:
-            color_scheme = schemes.get(core_color_code, None)
-        else:
-            color_scheme = schemes.get(core_color_code, None)[::-1]
-    return color_scheme
+        longest_scheme = schemes[longest_scheme_name]
+        if color_reverse:
+            longest_scheme = longest_scheme[::-1]
+        color_scheme = linear_gradient(longest_scheme, n)
+    elif color_reverse:
+        color_scheme = color_scheme[::-1]
+    return tuple(color_scheme)
 
 
 def image_to_url(
     image: Any,
     colormap: Union["ColorMap", Callable, None] = None,
     origin: str = "upper",
+    compression: int = 9,
+    strategy: str = "default",
+    png_filter: str = "none",
+    workers: Optional[int] = None,
+    indexed: bool = False,
 ) -> str:
     """Infers the type of an image argument and transforms it into a URL.
 
@@ -223,6 +253,8 @@ def image_to_url(
         for transforming a mono image into RGB.
         It must output iterables of length 3 or 4, with values between
         0. and 1.  Hint : you can use colormaps from `matplotlib.cm`.
+    compression, strategy, png_filter, workers, indexed :
+        The PNG compression settings for array-like images, see `write_png`.
     """
     if hasattr(image, "read"):
         # We got an image file.
@@ -240,7 +272,16 @@ def image_to_url(
         "__iter__",
     ):
         # We got an array-like object.
-        png = write_png(image, origin=origin, colormap=colormap)
+        png = write_png(
+            image,
+            origin=origin,
+            colormap=colormap,
+            compression=compression,
+            strategy=strategy,
+            png_filter=png_filter,
+            workers=workers,
+            indexed=indexed,
+        )
         url = "data:image/png;base64," + base64.b64encode(png).decode("utf-8")
     else:
         # We got an URL.
@@ -249,10 +290,110 @@ def image_to_url(
     return url.replace("\n", " ")
 
 
+def _mono_to_rgba(array: Any, colormap: Any) -> Any:
+    """Colors the 2D array `array` with a colormap exposing
+    `rgba_floats_array`, or in gray levels if `colormap` is None.
+    Returns an array of RGBA floats of shape `array.shape + (4,)`.
+
+    NaN values are transparent.
+    """
+    array = np.asarray(array, dtype=float)
+    if colormap is None:
+        rgba = np.empty(array.shape + (4,), dtype=float)
+        rgba[..., :3] = array[..., np.newaxis]
+        rgba[..., 3] = 1
+    else:
+        rgba = colormap.rgba_floats_array(array)
+    rgba[np.isnan(array)] = 0
+    return rgba
+
+
+_PNG_FILTERS = {"none": 0, "sub": 1, "up": 2, "average": 3, "paeth": 4}
+
+_ZLIB_STRATEGIES = {
+    "default": zlib.Z_DEFAULT_STRATEGY,
+    "filtered": zlib.Z_FILTERED,
+    "huffman": zlib.Z_HUFFMAN_ONLY,
+    "rle": zlib.Z_RLE,
+    "fixed": zlib.Z_FIXED,
+}
+
+
+def _filter_rows(rows: Any, previous: Any, filter_type: int, bpp: int = 4) -> Any:
+    """Applies the PNG filter `filter_type` to the uint8 array `rows` of
+    shape (height, width * bpp), `previous` being the row before the first one
+    (zeros for the first row of the image), `bpp` the number of bytes per
+    pixel. Returns a uint8 array of the same shape.
+    """
+    if filter_type == 0:
+        return rows
+    up = np.concatenate([previous[np.newaxis], rows[:-1]])
+    if filter_type == 2:
+        return rows - up
+    left = np.zeros_like(rows)
+    left[:, bpp:] = rows[:, :-bpp]
+    if filter_type == 1:
+        return rows - left
+    if filter_type == 3:
+        average = (left.astype(np.uint16) + up) >> 1
+        return rows - average.astype(np.uint8)
+    up_left = np.zeros_like(rows)
+    up_left[:, bpp:] = up[:, :-bpp]
+    a, b, c = (v.astype(np.int16) for v in (left, up, up_left))
+    pa, pb, pc = np.abs(b - c), np.abs(a - c), np.abs(a + b - 2 * c)
+    predictor = np.where((pa <= pb) & (pa <= pc), left, np.where(pb <= pc, up, up_left))
+    return rows - predictor
+
+
+def _png_scanlines(array: Any, png_filter: str, previous: Any = None) -> Any:
+    """Filters the rows of the uint8 image `array` of shape
+    (height, width, bpp), and returns the PNG scanlines as a uint8 array of
+    shape (height, 1 + width * bpp), each row starting with its filter type.
+    `bpp` is 4 for RGBA images, and 1 for indexed images, whose rows of
+    packed palette indices are given with a width in bytes.
+
+    `png_filter` is one of 'none', 'sub', 'up', 'average' and 'paeth', or
+    'adaptive' to choose for each row the filter giving the smallest sum of
+    absolute differences.
+    """
+    height, width, bpp = array.shape
+    rows = array.reshape(height, width * bpp)
+    if previous is None:
+        previous = np.zeros(width * bpp, dtype=np.uint8)
+    scanlines = np.empty((height, 1 + width * bpp), dtype=np.uint8)
+    if png_filter == "adaptive":
+        candidates = np.stack(
+            [_filter_rows(rows, previous, t, bpp) for t in range(5)],
+        )
+        costs = np.abs(candidates.view(np.int8).astype(np.int32)).sum(axis=2)
+        filter_types = costs.argmin(axis=0)
+        scanlines[:, 0] = filter_types
+        scanlines[:, 1:] = candidates[filter_types, np.arange(height)]
+    elif png_filter in _PNG_FILTERS:
+        scanlines[:, 0] = _PNG_FILTERS[png_filter]
+        scanlines[:, 1:] = _filter_rows(
+            rows,
+            previous,
+            _PNG_FILTERS[png_filter],
+            bpp,
+        )
+    else:
+        raise ValueError(
+            f"Unknown PNG filter {png_filter!r}, expected one of "
+            f"{sorted(_PNG_FILTERS) + ['adaptive']}.",
+        )
+    return scanlines
+
+
 def write_png(
     data: Any,
     origin: str = "upper",
     colormap: Union["ColorMap", Callable, None] = None,
+    compression: int = 9,
+    strategy: str = "default",
+    png_filter: str = "none",
+    workers: Optional[int] = None,
+    indexed: bool = False,
 ) -> bytes:
     """
     Transform an array of data into a PNG string.
@@ -278,32 +419,152 @@ def write_png(
         - use a colormap from `matplotlib.cm`
         - use a custom function of the form [x -> (r,g,b)] or [x -> (r,g,b,a)].
           It must output iterables of length 3 or 4 with values between 0 and 1.
+        - use an object with a `rgba_floats_array` method like `ColorMap`,
+          taking an array of values and returning their RGBA colors as
+          floats between 0 and 1 in an array of shape `x.shape + (4,)`.
+        `ColorMap` objects and other objects with a `rgba_floats_array` method
+        color the whole image at once. NaN values are then transparent.
+    compression : int, default 9
+        The zlib compression level, from 0 (no compression) to 9 (smallest
+        output, slowest).
+    strategy : str, default 'default'
+        The zlib compression strategy: 'default', 'filtered', 'huffman',
+        'rle' or 'fixed'. 'rle' is much faster than 'default' on images with
+        large areas of uniform color.
+    png_filter : str, default 'none'
+        The filter applied to the rows of the image before compression:
+        'none', 'sub', 'up', 'average', 'paeth', or 'adaptive' to choose
+        the best one for each row. Filters other than 'none' usually give
+        a smaller output for photographs and smooth gradients.
+    workers : int, optional
+        If given, the image data is split into blocks of 128 KiB compressed
+        in parallel by that many threads, as pigz does. The output is a
+        valid PNG image, slightly larger and with other bytes than without
+        `workers`.
+    indexed : bool, default False
+        If True, mono data is written as an indexed-color image: each pixel
+        is stored as its position in a palette of at most 256 colors, on 1,
+        2, 4 or 8 bits depending on the number of colors used, instead of
+        4 bytes. It needs a `ColorMap` or a color scale as `colormap`.
+        With a `StepColormap` of at most 255 colors, the palette holds its
+        colors and the image is the same as without `indexed`. Other
+        colormaps are sampled into a table of 255 colors, leaving room for
+        the transparent color of NaN values, each value getting the nearest
+        color of the table. The colors may then differ by a few levels from
+        the image without `indexed`, see `ColorMap.to_lut`.
 
     Returns
     -------
     PNG formatted byte string
     """
-    from branca.colormap import ColorMap
+    output = io.BytesIO()
+    _write_png(
+        output,
+        data,
+        origin=origin,
+        colormap=colormap,
+        compression=compression,
+        strategy=strategy,
+        png_filter=png_filter,
+        strip_height=None,
+        idat_size=None,
+        workers=workers,
+        indexed=indexed,
+    )
+    return output.getvalue()
 
-    if np is None:
-        raise ImportError("The NumPy package is required" " for this functionality")
 
-    if isinstance(colormap, ColorMap):
-        colormap_callable = colormap.rgba_floats_tuple
-    elif callable(colormap):
-        colormap_callable = colormap
-    else:
-        colormap_callable = lambda x: (x, x, x, 1)  # noqa E731
+def write_png_stream(
+    data: Any,
+    file: Any,
+    origin: str = "upper",
+    colormap: Union["ColorMap", Callable, None] = None,
+    compression: int = 9,
+    strategy: str = "default",
+    png_filter: str = "none",
+    strip_height: int = 256,
+    idat_size: int = 1 << 16,
+    workers: Optional[int] = None,
+    indexed: bool = False,
+):
+    """
+    Writes an array of data as a PNG image into a file, processing it by
+    strips of rows so that the memory used stays proportional to the size of
+    a strip rather than of the image. The output is the same image as with
+    `write_png`, split into several IDAT chunks.
 
-    array = np.atleast_3d(data)
-    height, width, nblayers = array.shape
+    Parameters
+    ----------
+    data: numpy array, memory-mapped array or path of a `.npy` file.
+        Must be NxM (mono), NxMx3 (RGB) or NxMx4 (RGBA). A `.npy` file is
+        memory-mapped, and only one strip of it is read at a time.
+    file: path or file-like object
+        The file where the PNG image is written, or an object with a
+        `write` method.
+    origin, colormap, compression, strategy, png_filter, workers, indexed :
+        See `write_png`.
+    strip_height : int, default 256
+        The number of rows processed at once.
+    idat_size : int, default 65536
+        The size of the IDAT chunks of the PNG image, in bytes.
+
+    Images which are not already uint8 are normalized by the maximal value of
+    each channel, as in `write_png`. They are then read and colored twice: a
+    first pass finds the maximal values, the second one writes the image.
+    Indexed images are also read twice, to find the colors used.
+    """
+    if isinstance(file, (str, os.PathLike)):
+        with open(file, "wb") as f:
+            write_png_stream(
+                data,
+                f,
+                origin=origin,
+                colormap=colormap,
+                compression=compression,
+                strategy=strategy,
+                png_filter=png_filter,
+                strip_height=strip_height,
+                idat_size=idat_size,
+                workers=workers,
+                indexed=indexed,
+            )
+        return
+    if strip_height < 1:
+        raise ValueError("`strip_height` must be a positive integer.")
+    _write_png(
+        file,
+        data,
+        origin=origin,
+        colormap=colormap,
+        compression=compression,
+        strategy=strategy,
+        png_filter=png_filter,
+        strip_height=strip_height,
+        idat_size=idat_size,
+        workers=workers,
+        indexed=indexed,
+    )
 
-    if nblayers not in [1, 3, 4]:
-        raise ValueError("Data must be NxM (mono), " "NxMx3 (RGB), or NxMx4 (RGBA)")
-    assert array.shape == (height, width, nblayers)
 
-    if nblayers == 1:
-        array = np.array(list(map(colormap_callable, array.ravel())))
+def _rgba_strip(array: Any, colormap: Any) -> Any:
+    """Converts the rows `array` of an image of shape (height, width, bands)
+    to RGBA, as floats or as the input type. They are not normalized yet.
+    """
+    from branca.colormap import ColorMap
+
+    height, width, nblayers = array.shape
+
+    if nblayers == 1 and not callable(colormap):
+        array = _mono_to_rgba(array[:, :, 0], None)
+        nblayers = 4
+    elif nblayers == 1 and (
+        isinstance(colormap, ColorMap) or hasattr(colormap, "rgba_floats_array")
+    ):
+        # Vectorized path, for colormaps with a batch interface.
+        array = _mono_to_rgba(array[:, :, 0], colormap)
+        nblayers = 4
+    elif nblayers == 1:
+        array = np.array(list(map(colormap, array.ravel())))
         nblayers = array.shape[1]
         if nblayers not in [3, 4]:
             raise ValueError(
@@ -317,20 +578,308 @@ def write_png(
         nblayers = 4
     assert array.shape == (height, width, nblayers)
     assert nblayers == 4
+    return array
 
-    # Normalize to uint8 if it isn't already.
-    if array.dtype != "uint8":
-        with np.errstate(divide="ignore", invalid="ignore"):
-            array = array * 255.0 / array.max(axis=(0, 1)).reshape((1, 1, 4))
-            array[~np.isfinite(array)] = 0
-        array = array.astype("uint8")
 
-    # Eventually flip the image.
+def _png_strips(
+    array: Any,
+    origin: str,
+    colormap: Any,
+    strip_height: Optional[int],
+) -> Iterator[Any]:
+    """Yields the rows of the image `array` in the order of the PNG image, by
+    strips of `strip_height` rows (all at once if None), as uint8 RGBA arrays.
+    """
+    height = array.shape[0]
+    step = strip_height or max(height, 1)
+    bounds = [(y, min(y + step, height)) for y in range(0, height, step)]
     if origin == "lower":
-        array = array[::-1, :, :]
+        bounds.reverse()
+
+    strips: Iterator[Any] = (
+        _rgba_strip(array[start:end], colormap) for start, end in bounds
+    )
+    first = next(strips, None)
+    if first is None:
+        return
+    if first.dtype != "uint8":
+        if len(bounds) == 1:
+            maxima = first.max(axis=(0, 1))
+            strips = iter([first])
+        else:
+            maxima = np.maximum.reduce(
+                [first.max(axis=(0, 1))] + [strip.max(axis=(0, 1)) for strip in strips],
+            )
+            strips = (_rgba_strip(array[start:end], colormap) for start, end in bounds)
+    else:
+        strips = itertools.chain([first], strips)
+
+    for strip in strips:
+        # Normalize to uint8 if it isn't already.
+        if strip.dtype != "uint8":
+            with np.errstate(divide="ignore", invalid="ignore"):
+                strip = strip * 255.0 / maxima.reshape((1, 1, 4))
+                strip[~np.isfinite(strip)] = 0
+            strip = strip.astype("uint8")
+
+        # Eventually flip the image.
+        if origin == "lower":
+            strip = strip[::-1, :, :]
+        yield strip
+
+
+def _palette_indices(array: Any, colormap: Any) -> Tuple[Any, Any]:
+    """Maps the values of the 2D array `array` to the colors of `colormap`.
+    Returns the palette, an array of n + 1 RGBA floats whose last color is
+    the transparent one of NaN values, and the positions of the colors of the
+    values in the palette, as an integer array of the shape of `array`.
+    """
+    from branca.colormap import (
+        ColorMap,
+        ColorScale,
+        StepColormap,
+        StepScale,
+        _lut_indices,
+    )
+
+    if isinstance(colormap, StepColormap):
+        colormap = colormap.color_scale
+    array = np.asarray(array, dtype=float)
+    nan = np.isnan(array)
+    if isinstance(colormap, StepScale):
+        colors = colormap._get_arrays()[1]
+        indices = colormap._step_indices(array)
+    elif isinstance(colormap, (ColorMap, ColorScale)):
+        # 255 colors, so that the palette has room for the NaN color.
+        vmin, vmax = colormap.index[0], colormap.index[-1]
+        colors = colormap.rgba_floats_array(np.linspace(vmin, vmax, 255))
+        indices = _lut_indices(np.where(nan, vmin, array), vmin, vmax, 255)
+    else:
+        raise ValueError(
+            "Indexed images need a ColorMap or a color scale as `colormap`.",
+        )
+    palette = np.concatenate([colors, np.zeros((1, 4))])
+    indices[nan] = len(colors)
+    return palette, indices
+
+
+def _pack_indices(indices: Any, bit_depth: int) -> Any:
+    """Packs the rows of palette indices `indices`, of shape (height, width),
+    on `bit_depth` bits each, the leftmost pixel in the high-order bits.
+    Returns a uint8 array of shape (height, row size in bytes, 1).
+    """
+    height, width = indices.shape
+    per_byte = 8 // bit_depth
+    if per_byte == 1:
+        return indices.astype(np.uint8)[:, :, np.newaxis]
+    padded = np.zeros((height, -(-width // per_byte) * per_byte), dtype=np.uint8)
+    padded[:, :width] = indices
+    shifts = (8 - bit_depth - bit_depth * np.arange(per_byte)).astype(np.uint8)
+    packed = padded.reshape(height, -1, per_byte) << shifts
+    return np.bitwise_or.reduce(packed, axis=2)[:, :, np.newaxis]
+
+
+def _png_palette_strips(
+    array: Any,
+    origin: str,
+    colormap: Any,
+    strip_height: Optional[int],
+) -> Tuple[Any, int, Iterator[Any]]:
+    """Prepares the indexed image of the mono image `array` of shape
+    (height, width, 1). Returns its palette of uint8 RGBA colors, the bit
+    depth of its pixels, and an iterator over its rows in the order of the
+    PNG image, by strips of `strip_height` rows (all at once if None), as
+    arrays of packed indices of shape (height, row size in bytes, 1).
+
+    The palette only holds the colors used, normalized as in `_png_strips`.
+    """
+    height = array.shape[0]
+    step = strip_height or max(height, 1)
+    bounds = [(y, min(y + step, height)) for y in range(0, height, step)]
+    if origin == "lower":
+        bounds.reverse()
+
+    def indices(start: int, end: int) -> Any:
+        return _palette_indices(array[start:end, :, 0], colormap)[1]
+
+    palette, strip_indices = _palette_indices(array[:0, :, 0], colormap)
+    used = np.zeros(len(palette), dtype=bool)
+    if len(bounds) == 1:
+        strip_indices = indices(*bounds[0])
+        used[strip_indices] = True
+    else:
+        for start, end in bounds:
+            used[indices(start, end)] = True
+    if not used.any():
+        # A palette needs at least one color.
+        used[0] = True
+    if used.sum() > 256:
+        raise ValueError(
+            f"An indexed image holds at most 256 colors, {used.sum()} are used.",
+        )
+
+    # Same normalization to uint8 as for the other images.
+    maxima = palette[used].max(axis=0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        palette = palette[used] * 255.0 / maxima
+        palette[~np.isfinite(palette)] = 0
+    palette = palette.astype("uint8")
+    positions = np.cumsum(used) - 1
+
+    bit_depth = 8
+    for depth in [1, 2, 4]:
+        if len(palette) <= 1 << depth:
+            bit_depth = depth
+            break
+
+    def strips() -> Iterator[Any]:
+        for start, end in bounds:
+            if len(bounds) == 1:
+                strip = strip_indices
+            else:
+                strip = indices(start, end)
+            strip = positions[strip]
+            # Eventually flip the image.
+            if origin == "lower":
+                strip = strip[::-1]
+            yield _pack_indices(strip, bit_depth)
+
+    return palette, bit_depth, strips()
+
+
+class _ParallelDeflate:
+    """A zlib compressor splitting its input into blocks compressed in
+    parallel by the `workers` threads of `pool`, like pigz does. It has the
+    `compress` and `flush` methods of `zlib.compressobj`, and gives a single
+    zlib stream.
+
+    Each block is compressed as raw deflate data, ending with a sync flush
+    on a byte boundary so that the blocks can be concatenated. The 32 KiB of
+    data before a block are used as its dictionary, to compress almost as
+    well as in one go. zlib releases the GIL while compressing, so the blocks
+    are compressed at the same time.
+    """
 
-    # Transform the array to bytes.
-    raw_data = b"".join([b"\x00" + array[i, :, :].tobytes() for i in range(height)])
+    block_size = 1 << 17
+    window_size = 1 << 15
+
+    def __init__(
+        self,
+        level: int,
+        strategy: int,
+        pool: ThreadPoolExecutor,
+        workers: int,
+    ):
+        self._level = 6 if level == -1 else level
+        self._strategy = strategy
+        self._pool = pool
+        self._workers = workers
+        self._pending = bytearray()
+        self._history = b""
+        self._adler = zlib.adler32(b"")
+        self._started = False
+
+    def _header(self) -> bytes:
+        """The two bytes zlib writes before the deflate data."""
+        if self._level < 2 or self._strategy >= zlib.Z_HUFFMAN_ONLY:
+            level_flag = 0
+        elif self._level < 6:
+            level_flag = 1
+        elif self._level == 6:
+            level_flag = 2
+        else:
+            level_flag = 3
+        header = 0x7800 | (level_flag << 6)
+        return struct.pack("!H", header + 31 - header % 31)
+
+    def _compress_block(self, block: Any, dictionary: bytes, last: bool) -> bytes:
+        options = {"zdict": dictionary} if dictionary else {}
+        compressor = zlib.compressobj(
+            self._level,
+            zlib.DEFLATED,
+            -zlib.MAX_WBITS,
+            zlib.DEF_MEM_LEVEL,
+            self._strategy,
+            **options,
+        )
+        flush_mode = zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH
+        return compressor.compress(block) + compressor.flush(flush_mode)
+
+    def _compress_blocks(self, data: bytes, last: bool) -> bytes:
+        view = memoryview(data)
+        starts = range(0, max(len(data), 1), self.block_size)
+        futures = []
+        for start in starts:
+            if start >= self.window_size:
+                dictionary = data[start - self.window_size : start]
+            else:
+                dictionary = (self._history + data[:start])[-self.window_size :]
+            is_last = last and start == starts[-1]
+            block = view[start : start + self.block_size]
+            futures.append(
+                self._pool.submit(self._compress_block, block, dictionary, is_last),
+            )
+        self._adler = zlib.adler32(data, self._adler)
+        self._history = (self._history + data[-self.window_size :])[-self.window_size :]
+        output = b"" if self._started else self._header()
+        self._started = True
+        return output + b"".join(future.result() for future in futures)
+
+    def compress(self, data: Any) -> bytes:
+        self._pending += memoryview(data).cast("B")
+        if len(self._pending) < self.block_size * self._workers:
+            return b""
+        size = len(self._pending) - len(self._pending) % self.block_size
+        data = bytes(self._pending[:size])
+        del self._pending[:size]
+        return self._compress_blocks(data, last=False)
+
+    def flush(self) -> bytes:
+        data = bytes(self._pending)
+        self._pending = bytearray()
+        return self._compress_blocks(data, last=True) + struct.pack("!I", self._adler)
+
+
+def _write_png(
+    file: Any,
+    data: Any,
+    origin: str,
+    colormap: Any,
+    compression: int,
+    strategy: str,
+    png_filter: str,
+    strip_height: Optional[int],
+    idat_size: Optional[int],
+    workers: Optional[int] = None,
+    indexed: bool = False,
+):
+    """Writes the PNG image of `data` into `file`, processing the image by
+    strips of `strip_height` rows and writing IDAT chunks of `idat_size` bytes.
+    If they are None, the image is processed at once into a single IDAT.
+    If `workers` is given, the compression is done by that many threads.
+    If `indexed` is True, the image is written with a palette.
+    """
+    if np is None:
+        raise ImportError("The NumPy package is required" " for this functionality")
+
+    if isinstance(data, (str, os.PathLike)):
+        data = np.load(data, mmap_mode="r")
+    array = np.atleast_3d(data)
+    height, width, nblayers = array.shape
+
+    if nblayers not in [1, 3, 4]:
+        raise ValueError("Data must be NxM (mono), " "NxMx3 (RGB), or NxMx4 (RGBA)")
+    assert array.shape == (height, width, nblayers)
+
+    if strategy not in _ZLIB_STRATEGIES:
+        raise ValueError(
+            f"Unknown compression strategy {strategy!r}, expected one of "
+            f"{sorted(_ZLIB_STRATEGIES)}.",
+        )
+    if workers is not None and workers < 1:
+        raise ValueError("`workers` must be a positive integer.")
+    if indexed and nblayers != 1:
+        raise ValueError("Only mono data can be written as an indexed image.")
 
     def png_pack(png_tag, data):
         chunk_head = png_tag + data
@@ -340,14 +889,69 @@ def write_png(
             + struct.pack("!I", 0xFFFFFFFF & zlib.crc32(chunk_head))
         )
 
-    return b"".join(
-        [
-            b"\x89PNG\r\n\x1a\n",
-            png_pack(b"IHDR", struct.pack("!2I5B", width, height, 8, 6, 0, 0, 0)),
-            png_pack(b"IDAT", zlib.compress(raw_data, 9)),
-            png_pack(b"IEND", b""),
-        ],
-    )
+    pool: Optional[ThreadPoolExecutor] = None
+    compressor: Any
+    if workers is None:
+        compressor = zlib.compressobj(
+            compression,
+            strategy=_ZLIB_STRATEGIES[strategy],
+        )
+    else:
+        pool = ThreadPoolExecutor(max_workers=workers)
+        compressor = _ParallelDeflate(
+            compression,
+            _ZLIB_STRATEGIES[strategy],
+            pool,
+            workers,
+        )
+
+    strips: Iterator[Any]
+    if indexed:
+        palette, bit_depth, strips = _png_palette_strips(
+            array,
+            origin,
+            colormap,
+            strip_height,
+        )
+        header = struct.pack("!2I5B", width, height, bit_depth, 3, 0, 0, 0)
+    else:
+        strips = _png_strips(array, origin, colormap, strip_height)
+        header = struct.pack("!2I5B", width, height, 8, 6, 0, 0, 0)
+
+    try:
+        file.write(b"\x89PNG\r\n\x1a\n")
+        file.write(png_pack(b"IHDR", header))
+        if indexed:
+            file.write(png_pack(b"PLTE", palette[:, :3].tobytes()))
+            # The alpha values of the palette, omitting the last opaque ones.
+            alpha = palette[:, 3].tobytes().rstrip(b"\xff")
+            if alpha:
+                file.write(png_pack(b"tRNS", alpha))
+
+        # Compressed data waiting to be written in IDAT chunks.
+        pending = bytearray()
+        previous = None
+        for strip in strips:
+            # Transform the array to bytes.
+            scanlines = _png_scanlines(
+                np.ascontiguousarray(strip),
+                png_filter,
+                previous,
+            )
+            previous = strip[-1].reshape(-1)
+            pending += compressor.compress(scanlines)
+            while idat_size is not None and len(pending) >= idat_size:
+                file.write(png_pack(b"IDAT", bytes(pending[:idat_size])))
+                del pending[:idat_size]
+        pending += compressor.flush()
+        while idat_size is not None and len(pending) > idat_size:
+            file.write(png_pack(b"IDAT", bytes(pending[:idat_size])))
+            del pending[:idat_size]
+        file.write(png_pack(b"IDAT", bytes(pending)))
+        file.write(png_pack(b"IEND", b""))
+    finally:
+        if pool is not None:
+            pool.shutdown()
 
 
 def _camelify(out: str) -> str:
@@ -151,3 +151,620 @@ def test_max_labels_step(max_labels, expected):
     except AssertionError:  # rendering outside parent Figure raises error
         pass
     assert colorbar.tick_labels == expected
+
+
+@pytest.mark.parametrize(
+    "colormap",
+    [
+        cm.LinearColormap(["black", "red", "lime", "blue"], index=[1, 2, 4, 5]),
+        cm.LinearColormap(["red", "orange", "yellow"], index=[0, 0.5, 0.5]),
+        cm.StepColormap(["black", "red", "lime", "blue"], index=[1, 2, 4, 5]),
+        cm.StepColormap(["black", "red", "lime", "blue"], index=[1, 2, 4, 5, 10]),
+        cm.LinearColormap(["red", "blue"], index=[2, 2]),
+        cm.StepColormap(["red", "blue"], index=[2, 2, 2]),
+    ],
+)
+def test_array_matches_scalar(colormap):
+    import warnings
+
+    np = pytest.importorskip("numpy")
+    values = np.array([-1, 0.99, 1, 1.5, 2, 2.01, 3, 4, 4.5, 4.99, 5, 7, 10, 20])
+    values = np.concatenate([values, [-np.inf, np.inf]])
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        floats = colormap.rgba_floats_array(values)
+    assert floats.shape == (len(values), 4)
+    assert floats.tolist() == [list(colormap.rgba_floats_tuple(x)) for x in values]
+    assert colormap.rgba_bytes_array(values).tolist() == [
+        list(colormap.rgba_bytes_tuple(x)) for x in values
+    ]
+    assert colormap.rgba_hex_array(values).tolist() == [colormap(x) for x in values]
+    assert colormap.rgb_hex_array(values).tolist() == [
+        colormap.rgb_hex_str(x) for x in values
+    ]
+
+
+def test_array_shape():
+    np = pytest.importorskip("numpy")
+    linear = cm.LinearColormap(["green", "yellow", "red"], vmin=3.0, vmax=10.0)
+    values = np.linspace(0, 12, 24).reshape(2, 3, 4)
+    assert linear.rgba_floats_array(values).shape == (2, 3, 4, 4)
+    assert linear.rgba_bytes_array(values).dtype == np.uint8
+    assert linear.rgba_hex_array(values).shape == (2, 3, 4)
+    assert linear.rgba_hex_array(5.0) == linear(5.0)
+
+
+@pytest.mark.parametrize("cls", [cm.LinearColormap, cm.StepColormap])
+def test_unsorted_index(cls):
+    with pytest.raises(ValueError, match="not sorted"):
+        cls(["red", "yellow", "green"], index=[0, 2, 1])
+    colormap = cls(["red", "yellow", "green"], index=[0, 1, 2])
+    with pytest.raises(ValueError, match="not sorted"):
+        colormap.index = [2, 1, 0]
+    # Only the index is checked, not `vmin` and `vmax`.
+    colormap = cls(["red", "blue"], index=[0, 1], vmin=1, vmax=0)
+    assert colormap.index == [0, 1]
+    assert colormap(0.25) == colormap.color_scale(0.25)
+
+
+def test_index_update():
+    linear = cm.LinearColormap(["black", "red"], index=[0, 1])
+    assert linear(0.5) == "#7f0000ff"
+    linear.index = [0, 2]
+    assert linear(1) == "#7f0000ff"
+    linear.colors = [(0.0, 0.0, 0.0, 1.0), (0.0, 0.0, 1.0, 1.0)]
+    assert linear(1) == "#00007fff"
+
+
+def test_index_update_in_place():
+    import copy
+    import pickle
+
+    colors = ["red", "green", "blue"]
+    linear = cm.LinearColormap(colors, index=[0, 5, 10]).enable_cache()
+    assert linear(3) == "#664d00ff"
+    linear.index[1] = 8
+    assert linear(3) == cm.LinearColormap(colors, index=[0, 8, 10])(3) == "#9f3000ff"
+    linear.colors[0] = (0.0, 0.0, 0.0, 1.0)
+    assert linear(3) == "#003000ff"
+    linear.colors.reverse()
+    assert linear(3) == cm.LinearColormap(["blue", "green", "black"], [0, 8, 10])(3)
+
+    step = cm.linear.viridis.to_step(4)
+    assert step(0.1) == step.color_scale(0.1)
+    step.colors[0] = (1.0, 0.0, 0.0, 1.0)
+    assert step(0.1) == "#ff0000ff"
+    step.index.insert(0, -1)
+    step.colors.insert(0, (0.0, 0.0, 0.0, 1.0))
+    assert step(-0.5) == "#000000ff"
+
+    # Copies have their own lists.
+    for other in [copy.deepcopy(step), pickle.loads(pickle.dumps(step))]:
+        other.index[1] = -0.5
+        assert (other(-0.25), step(-0.25)) == ("#ff0000ff", "#000000ff")
+
+
+@pytest.mark.parametrize("n", [256, 1024, 4096])
+def test_lut(n):
+    np = pytest.importorskip("numpy")
+    linear = cm.LinearColormap(["black", "red", "lime", "blue"], index=[1, 2, 4, 5])
+    lut = linear.to_lut(n)
+    assert lut.shape == (n, 4)
+    assert lut.dtype == np.uint8
+    assert linear.to_lut(n) is lut
+
+    values = np.linspace(0, 6, 10001)
+    exact = linear.rgba_bytes_array(values).astype(int)
+    approx = linear.rgba_bytes_array(values, lut=n).astype(int)
+    assert np.abs(exact - approx).max() <= 1 + 255 * 4 / (2 * (n - 1))
+
+    step = cm.StepColormap(["black", "red", "lime", "blue"], index=[1, 2, 4, 5])
+    exact = step.rgba_bytes_array(values)
+    approx = step.rgba_bytes_array(values, lut=n)
+    index = np.array(step.index)
+    near = np.abs(values[:, None] - index).min(axis=1) < 4 / (2 * (n - 1))
+    assert (exact == approx).all(axis=1)[~near].all()
+
+
+def test_lut_invalidation():
+    pytest.importorskip("numpy")
+    linear = cm.LinearColormap(["black", "red"])
+    assert linear.to_lut(2).tolist() == [[0, 0, 0, 255], [255, 0, 0, 255]]
+    linear.colors = [(0.0, 0.0, 0.0, 1.0), (0.0, 0.0, 1.0, 1.0)]
+    assert linear.to_lut(2).tolist() == [[0, 0, 0, 255], [0, 0, 255, 255]]
+
+
+def test_hex_cache():
+    linear = cm.LinearColormap(["black", "red"], index=[0, 1])
+    assert linear.cache_info() == (0, 0, 0, 0)
+    linear(0.5)
+    assert linear.cache_info().misses == 0
+
+    assert linear.enable_cache(maxsize=2) is linear
+    assert linear(0.5) == "#7f0000ff"
+    assert linear(0.5) == "#7f0000ff"
+    assert linear.rgb_hex_str(0.5) == "#7f0000"
+    assert linear.cache_info() == (1, 2, 2, 2)
+
+    linear(1)  # evicts the least recently used value
+    assert linear.cache_info() == (1, 3, 2, 2)
+    linear(0.5)
+    assert linear.cache_info() == (1, 4, 2, 2)
+
+    linear.colors = [(0.0, 0.0, 0.0, 1.0), (0.0, 0.0, 1.0, 1.0)]
+    assert linear.cache_info().currsize == 0
+    assert linear(0.5) == "#00007fff"
+    linear.vmax = 2
+    assert linear.cache_info().currsize == 0
+
+    linear.cache_clear()
+    assert linear.cache_info() == (0, 0, 2, 0)
+    linear.disable_cache()
+    linear(0.5)
+    assert linear.cache_info() == (0, 0, 0, 0)
+
+
+def test_hex_encode():
+    np = pytest.importorskip("numpy")
+    colors = np.array([[0, 0, 0, 255], [255, 0, 16, 128], [1, 2, 3, 4]], dtype=np.uint8)
+    assert cm.hex_encode(colors).tolist() == ["#000000ff", "#ff001080", "#01020304"]
+    assert cm.hex_encode(colors, alpha=False).tolist() == [
+        "#000000",
+        "#ff0010",
+        "#010203",
+    ]
+    assert cm.hex_encode([[1, 2, 3]]).tolist() == ["#010203ff"]
+    assert cm.hex_encode(colors.reshape(3, 1, 4)).shape == (3, 1)
+    assert cm.hex_encode(np.zeros((0, 4))).shape == (0,)
+    with pytest.raises(ValueError):
+        cm.hex_encode([1, 2])
+
+
+def test_legend_ramp_cache():
+    linear = cm.LinearColormap(["black", "red"], vmin=0, vmax=10)
+    domain, colors = linear._get_legend_ramp()
+    assert domain == [0, 10]
+    assert colors == [[0.0, 0.0, 0.0, 1.0], [1.0, 0.0, 0.0, 1.0]]
+    assert linear._get_legend_ramp()[1] is colors
+
+    linear.vmax = 20
+    assert linear._get_legend_ramp()[0][-1] == 20
+    linear.colors = [(0.0, 0.0, 0.0, 1.0), (0.0, 0.0, 1.0, 1.0)]
+    assert linear._get_legend_ramp()[1][-1] == [0.0, 0.0, 1.0, 1.0]
+
+    linear = cm.LinearColormap(
+        ["red", "blue", "green", "black", "white"],
+        index=[0, 5, 5, 10, 30],
+        vmax=20,
+    )
+    domain, colors = linear._get_legend_ramp()
+    assert domain == [0, 5, 5, 10, 20]
+    assert colors[1:3] == [[0.0, 0.0, 1.0, 1.0], [0.0, 128 / 255, 0.0, 1.0]]
+
+    step = cm.StepColormap(["red", "green", "blue"], index=[0, 1, 5, 10], vmax=5)
+    assert step._get_legend_ramp() == ([1.0], ["#ff0000ff", "#008000ff"])
+
+
+def test_legend_render():
+    from branca.element import Figure
+
+    linear = cm.linear.viridis.scale(0, 10)
+    figure = Figure()
+    figure.add_child(linear)
+    html = figure.render()
+    assert "{}.color = (function(stops, colors, n)".format(linear.get_name()) in html
+    assert "#440154ff" not in html
+    assert len(html) < 6000
+
+    step = cm.step.OrRd_06.scale(0, 6)
+    figure = Figure()
+    figure.add_child(step)
+    html = figure.render()
+    assert ".domain([1.0, 2.0, 3.0, 4.0, 5.0])" in html
+    assert "'#fef0d9ff', '#fdd49eff'" in html
+
+
+def test_builtin_colormaps_lazy():
+    registry = cm._LinearColormaps()
+    assert "viridis" not in vars(registry)
+    assert "viridis" in dir(registry)
+    viridis = registry.viridis
+    assert isinstance(viridis, cm.LinearColormap)
+    assert registry.viridis is viridis
+    assert registry._colormaps["viridis"] is viridis
+    assert len(registry._colormaps) == len(registry._schemes)
+    with pytest.raises(AttributeError):
+        registry.not_a_colormap
+    assert isinstance(cm.step.viridis, cm.StepColormap)
+
+
+def test_color_tables():
+    assert cm._parse_color("Red") == (1.0, 0.0, 0.0, 1.0)
+    with pytest.raises(ValueError, match="not_a_color"):
+        cm._parse_color("not_a_color")
+    assert cm._get_scheme_colors("YlGnBu_03") == tuple(
+        cm._parse_hex(code) for code in cm._schemes["YlGnBu_03"]
+    )
+    assert cm._cnames["red"] == "#FF0000"
+
+    # The compatibility accessors give copies of the shared tables.
+    codes = list(cm._schemes["YlGnBu_03"])
+    for schemes in [cm._schemes, cm.linear._schemes, cm.step._schemes]:
+        schemes["YlGnBu_03"].reverse()
+        schemes.clear()
+    cm._cnames.clear()
+    assert cm._get_schemes()["YlGnBu_03"] == codes
+    assert cm._LinearColormaps().YlGnBu_03(0) == codes[0].lower() + "ff"
+    assert cm._cnames["red"] == "#FF0000"
+
+
+def test_to_step_data_types():
+    np = pytest.importorskip("numpy")
+    some_list = [30.6, 50, 51, 52, 53, 54, 55, 60, 70, 100]
+    lc = cm.linear.YlOrRd_06
+    quantiles = [0, 0.3, 0.7, 1]
+
+    s = sorted(some_list)
+    p = len(s) - 1
+    expected = [
+        s[int(q * p)] * (1.0 - (q * p) % 1) + s[min(int(q * p) + 1, p)] * ((q * p) % 1)
+        for q in quantiles
+    ]
+    assert lc.to_step(data=some_list, quantiles=quantiles).index == expected
+
+    linear_index = lc.to_step(data=some_list, n=2).index
+    chunks = [some_list[:3], np.array(some_list[3:]), [np.nan]]
+    for data in [np.array(some_list + [np.nan]), chunks]:
+        assert lc.to_step(data=data, quantiles=quantiles).index == expected
+        assert lc.to_step(data=data, n=2).index == linear_index
+    assert lc.to_step(data=iter(chunks), quantiles=quantiles).index == expected
+
+    with pytest.raises(ValueError):
+        lc.to_step(data=[np.nan], n=2)
+    with pytest.raises(ValueError):
+        lc.to_step(data=iter([]), n=2, method="quantiles")
+
+
+@pytest.mark.parametrize("method", ["linear", "log"])
+def test_to_step_chunks_one_pass(method):
+    import weakref
+
+    np = pytest.importorskip("numpy")
+    lc = cm.linear.YlOrRd_06
+    values = np.random.default_rng(0).uniform(1, 100, size=10_000)
+    expected = lc.to_step(data=values, n=4, method=method).index
+
+    refs = []
+
+    def chunks():
+        for start in range(0, len(values), 1000):
+            # The chunks are not kept: the one before the previous one is
+            # released when the next one is read.
+            assert len(refs) < 2 or refs[-2]() is None
+            chunk = values[start : start + 1000].copy()
+            refs.append(weakref.ref(chunk))
+            yield chunk
+
+    assert lc.to_step(data=chunks(), n=4, method=method).index == expected
+    assert len(refs) == 10
+
+
+def test_to_step_approximate():
+    np = pytest.importorskip("numpy")
+    rng = np.random.default_rng(0)
+    chunks = [rng.lognormal(size=100_000) for _ in range(10)]
+    values = np.concatenate(chunks)
+    quantiles = [0, 0.01, 0.25, 0.5, 0.75, 0.99, 1]
+
+    step = cm.linear.YlOrRd_06.to_step(
+        data=iter(chunks),
+        quantiles=quantiles,
+        approximate=True,
+    )
+    assert step.index[0] == values.min()
+    assert step.index[-1] == values.max()
+    ranks = np.searchsorted(np.sort(values), step.index) / len(values)
+    assert np.abs(ranks - quantiles).max() < 0.002
+
+
+def _brute_force_jenks(values, n):
+    import itertools
+
+    np = pytest.importorskip("numpy")
+    x = np.sort(values)
+    best = None
+    for cuts in itertools.combinations(range(1, len(x)), n - 1):
+        classes = np.split(x, cuts)
+        if any(x_[0] == y[-1] for x_, y in zip(classes[1:], classes[:-1])):
+            continue  # equal values must belong to the same class
+        cost = sum(((c - c.mean()) ** 2).sum() for c in classes)
+        if best is None or cost < best[0] - 1e-9:
+            best = (cost, [x[0]] + [c[0] for c in classes[1:]] + [x[-1]])
+    return best[1]
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_jenks_breaks(seed):
+    np = pytest.importorskip("numpy")
+    values = np.random.default_rng(seed).integers(0, 30, size=14).astype(float)
+    for n in [2, 3, 4]:
+        assert cm._jenks_breaks(values, n) == _brute_force_jenks(values, n)
+
+
+def test_to_step_classification_methods():
+    np = pytest.importorskip("numpy")
+    data = np.array([1, 2, 2, 3, 10, 11, 12, 40, 41, 100, np.nan])
+    lc = cm.linear.YlOrRd_06
+
+    # The last class only holds 100.
+    assert lc.to_step(data=data, n=3, method="jenks").index == [1, 40, 100, 100]
+    assert lc.to_step(data=data, n=4, method="jenks").index == [1, 10, 40, 100, 100]
+    assert lc.to_step(data=data, n=4, method="count").index == [1, 2, 11, 41, 100]
+    # The mean is 22.2, the mean of the head [40, 41, 100] is 60.33...
+    assert lc.to_step(data=data, method="headtail").index == [
+        1,
+        pytest.approx(22.2),
+        pytest.approx(60.3333333),
+        100,
+    ]
+    assert len(lc.to_step(data=data, n=2, method="headtail").index) == 3
+
+    large = np.random.default_rng(0).normal(size=200_000)
+    breaks = lc.to_step(data=large, n=5, method="jenks", sample_size=2000).index
+    assert breaks[0] == large.min() and breaks[-1] == large.max()
+    assert len(breaks) == 6
+
+    with pytest.raises(ValueError):
+        lc.to_step(data=data, method="jenks")
+
+    # Constant data gives a single class, with the first color.
+    for method in ["jenks", "headtail"]:
+        step = lc.to_step(data=[5, 5, 5, 5], n=3, method=method)
+        assert step.index == [5, 5]
+        assert step.colors == [lc.colors[0]]
+        assert step(5) == lc(lc.vmin)
+
+
+@pytest.mark.parametrize(
+    "color,expected",
+    [
+        ("#ff0000", (1.0, 0.0, 0.0, 1.0)),
+        ("#f00", (1.0, 0.0, 0.0, 1.0)),
+        ("#ff000000", (1.0, 0.0, 0.0, 0.0)),
+        ("#f000", (1.0, 0.0, 0.0, 0.0)),
+        ("Red", (1.0, 0.0, 0.0, 1.0)),
+        ((1.0, 0.0, 0.0), (1.0, 0.0, 0.0, 1.0)),
+        ([1.0, 0.0, 0.0, 0.5], (1.0, 0.0, 0.0, 0.5)),
+    ],
+)
+def test_parse_color(color, expected):
+    assert cm._parse_color(color) == expected
+
+
+def test_parse_colors():
+    np = pytest.importorskip("numpy")
+    colors = cm.parse_colors(["#f00", "#00ff0080", "blue", (0.0, 0.0, 0.0)])
+    assert colors.shape == (4, 4)
+    assert colors.tolist() == [
+        [1.0, 0.0, 0.0, 1.0],
+        [0.0, 1.0, 0.0, 128 / 255],
+        [0.0, 0.0, 1.0, 1.0],
+        [0.0, 0.0, 0.0, 1.0],
+    ]
+    assert cm.parse_colors(np.zeros((5, 3))).tolist() == [[0.0, 0.0, 0.0, 1.0]] * 5
+    with pytest.raises(ValueError):
+        cm.parse_colors(np.zeros((5, 2)))
+    for invalid in ["#ff00000", "#gg0000", "not_a_color"]:
+        with pytest.raises(ValueError):
+            cm.parse_colors([invalid])
+
+    linear = cm.LinearColormap(np.array([[0.0, 0.0, 0.0], [1.0, 0.0, 0.0]]))
+    assert linear(0.5) == "#7f0000ff"
+
+
+def test_color_scale():
+    import pickle
+
+    scale = cm.LinearScale(["red", "blue", "green"], index=[0, 1, 4])
+    assert scale.colors[0] == (1.0, 0.0, 0.0, 1.0)
+    assert scale.index == (0, 1, 4)
+    assert scale(0.5) == cm.LinearColormap(["red", "blue", "green"], [0, 1, 4])(0.5)
+    with pytest.raises(AttributeError):
+        scale.vmin = 2
+    with pytest.raises(ValueError):
+        cm.LinearScale(["red", "blue"], index=[1, 0])
+
+    same = cm.LinearScale(["red", "blue", "green"], index=[0, 1, 4])
+    assert scale == same and hash(scale) == hash(same)
+    assert len({scale, same, scale.scale(0, 2)}) == 2
+    assert pickle.loads(pickle.dumps(scale)) == scale
+    assert scale != cm.StepScale(scale.colors, index=[0, 1, 2, 4])
+
+    scaled = scale.scale(0, 2)
+    assert scaled.colors is scale.colors
+    assert scaled.index == (0, 2, 8) and (scaled.vmin, scaled.vmax) == (0, 2)
+    # Same floats as the historical formula of `ColorMap.scale`.
+    index = [0.1, 0.37, 0.7, 2.9]
+    colormap = cm.LinearColormap(["red", "blue", "green", "red"], index, 0.1, 2.9)
+    for vmin, vmax in [(0.3, 7.1), (-3.3, 1e-3), (1 / 3, 2 / 3)]:
+        assert colormap.scale(vmin, vmax).index == [
+            vmin + (vmax - vmin) * (x - 0.1) * 1.0 / (2.9 - 0.1) for x in index
+        ]
+
+    step = scale.to_step(3)
+    assert isinstance(step, cm.StepScale)
+    assert list(step.to_linear().index) == step.to_colormap().to_linear().index
+
+
+def test_colormap_color_scale():
+    colormap = cm.linear.viridis.scale(0, 10)
+    scale = colormap.color_scale
+    assert isinstance(scale, cm.LinearScale)
+    assert colormap.color_scale is scale
+    assert scale.index == tuple(colormap.index)
+
+    colormap.vmin = 1
+    assert colormap.color_scale is not scale
+    assert colormap.color_scale.vmin == 1
+
+    wrapped = scale.to_colormap(caption="Viridis")
+    assert wrapped.caption == "Viridis"
+    assert wrapped.color_scale is scale
+    assert wrapped.to_step(5).color_scale == scale.to_step(5)
+
+
+def test_repr_html_ramp():
+    linear = cm.LinearColormap(["red", "green", "blue"], index=[0, 5, 20], vmax=10)
+    html = linear._repr_html_()
+    assert "<line " not in html
+    assert html.count("<stop ") == 3
+    assert '<stop offset="0.5" stop-color="#008000ff" />' in html
+    assert 'stop-color="{}"'.format(linear(10)) in html
+
+    step = cm.StepColormap(["red", "green", "blue"], index=[0, 1, 5, 10], vmax=5)
+    html = step._repr_html_()
+    assert "<line " not in html
+    assert html.count("<rect ") == 2
+    assert 'width="91" height="12" style="fill:#ff0000ff;"' in html
+    assert 'x="90" y="15" width="360" height="12" style="fill:#008000ff;"' in html
+
+
+def test_derived_colormaps_share_colors(monkeypatch):
+    linear = cm.LinearColormap(["red", "green", "blue"], vmin=0, vmax=4)
+    step = linear.to_step(4)
+
+    def fail(colors):
+        raise AssertionError("colors parsed again")
+
+    monkeypatch.setattr(cm, "_parse_colors", fail)
+    scaled = linear.scale(10, 20, max_labels=5)
+    assert scaled.color_scale.colors is linear.color_scale.colors
+    assert scaled.max_labels == 5
+    assert scaled(15) == linear(2)
+    assert step.scale(0, 1).color_scale.colors is step.color_scale.colors
+    assert isinstance(step.to_linear(), cm.LinearColormap)
+    assert isinstance(scaled.to_step(3), cm.StepColormap)
+
+    assert scaled.index == [10, 15, 20]
+    scaled.colors[0] = (0.0, 0.0, 0.0, 1.0)
+    assert linear.colors[0] == (1.0, 0.0, 0.0, 1.0)
+    scaled.colors = [(0.0, 0.0, 0.0, 1.0)] + scaled.colors[1:]
+    assert scaled(10) == "#000000ff" and linear(0) == "#ff0000ff"
+
+
+def test_array_inputs_and_missing():
+    import array
+
+    np = pytest.importorskip("numpy")
+    linear = cm.LinearColormap(["red", "blue"], vmin=0, vmax=4)
+    values = array.array("d", [0.0, 1.0, float("nan"), 4.0])
+    expected = linear.rgba_bytes_array(np.array([0.0, 1.0, 0.0, 4.0]))
+    expected[2] = 0
+
+    for x in [values, memoryview(values), np.frombuffer(values)]:
+        np.testing.assert_array_equal(linear.rgba_bytes_array(x), expected)
+    masked = np.ma.masked_invalid(np.frombuffer(values))
+    np.testing.assert_array_equal(linear.rgba_bytes_array(masked), expected)
+
+    colors = linear.rgba_bytes_array(values, missing="#00ff0080")
+    assert colors[2].tolist() == [0, 255, 0, 128]
+    assert linear.rgba_hex_array(values, missing="white")[2] == "#ffffffff"
+    assert linear.rgba_bytes_array(values, lut=256, missing="white")[2, 0] == 255
+
+    out = np.zeros((4, 4), dtype=np.uint8)
+    assert linear.rgba_bytes_array(values, out=out) is out
+    np.testing.assert_array_equal(out, expected)
+    buffer = bytearray(16)
+    linear.rgba_bytes_array(values, lut=256, out=buffer)
+    assert bytes(buffer) == linear.rgba_bytes_array(values, lut=256).tobytes()
+    with pytest.raises(ValueError):
+        linear.rgba_bytes_array(values, out=np.zeros((4, 3), dtype=np.uint8))
+
+
+def test_hex_codes():
+    np = pytest.importorskip("numpy")
+    step = cm.StepColormap(["red", "#0000ff80"], index=[0, 1, 2])
+    x = np.array([[0.5, 1.5, np.nan], [1.5, 1.5, 0.0]])
+
+    codes, colors = step.rgba_hex_codes(x)
+    assert codes.shape == x.shape and codes.dtype == np.int32
+    assert sorted(colors) == ["#00000000", "#0000ff80", "#ff0000ff"]
+    np.testing.assert_array_equal(colors[codes], step.rgba_hex_array(x))
+
+    codes, colors = step.rgb_hex_codes(x, missing="red")
+    assert sorted(colors) == ["#0000ff", "#ff0000"]
+    np.testing.assert_array_equal(colors[codes], step.rgb_hex_array(x, missing="red"))
+
+    scale = step.color_scale
+    np.testing.assert_array_equal(scale.rgba_hex_codes(x)[1], step.rgba_hex_codes(x)[1])
+
+
+def test_pandas_input():
+    pd = pytest.importorskip("pandas")
+    linear = cm.LinearColormap(["red", "blue"])
+    series = pd.Series([0, 1, None], dtype="Float64")
+    colors = linear.rgba_hex_array(series, missing="black")
+    assert colors.tolist() == ["#ff0000ff", "#0000ffff", "#000000ff"]
+
+
+@pytest.mark.parametrize("workers", [1, 3])
+def test_rgba_bytes_array_workers(workers):
+    np = pytest.importorskip("numpy")
+    linear = cm.linear.viridis.scale(0, 1)
+    x = np.random.default_rng(0).random((300, 400))
+    x[::7, ::5] = np.nan
+    for lut in [None, 256]:
+        expected = linear.rgba_bytes_array(x, lut=lut, missing="red")
+        colors = linear.rgba_bytes_array(x, lut=lut, missing="red", workers=workers)
+        np.testing.assert_array_equal(colors, expected)
+    out = np.empty((400, 300, 4), dtype=np.uint8).transpose(1, 0, 2)
+    with pytest.raises(ValueError):
+        linear.rgba_bytes_array(x, out=out, workers=workers)
+    with pytest.raises(ValueError):
+        linear.rgba_bytes_array(x, workers=0)
+
+
+def _shared_lut_colors(args):
+    lut, x = args
+    return lut.rgba_bytes_array(x)
+
+
+def test_shared_color_lut():
+    import multiprocessing
+    import pickle
+
+    np = pytest.importorskip("numpy")
+    linear = cm.linear.viridis.scale(0, 10)
+    x = np.linspace(-1, 11, 1000)
+    expected = linear.rgba_bytes_array(x, lut=256)
+
+    with cm.SharedColorLUT.publish(linear, 256) as lut:
+        np.testing.assert_array_equal(lut.table, linear.to_lut(256))
+        np.testing.assert_array_equal(lut.rgba_bytes_array(x), expected)
+        assert lut.rgba_hex_array([np.nan])[0] == "#00000000"
+
+        attached = pickle.loads(pickle.dumps(lut))
+        assert attached.name == lut.name and not attached.table.flags.writeable
+        np.testing.assert_array_equal(attached.rgba_bytes_array(x), expected)
+        attached.close()
+
+        with multiprocessing.Pool(2) as pool:
+            results = pool.map(_shared_lut_colors, [(lut, x)] * 2)
+        for colors in results:
+            np.testing.assert_array_equal(colors, expected)
+
+        with pytest.raises(ValueError):
+            lut.to_lut(1024)
+
+    # The block cannot be closed while a view of the table is referenced,
+    # but it is unlinked anyway.
+    with pytest.raises(BufferError):
+        with cm.SharedColorLUT.publish(linear, 256) as lut:
+            table = lut.to_lut(256)
+    np.testing.assert_array_equal(table, linear.to_lut(256))
+    del table
+    lut.close()
+    assert lut.table is None
+    with pytest.raises(FileNotFoundError):
+        cm.SharedColorLUT.attach(lut.name, 256, 0, 10)
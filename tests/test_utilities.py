@@ -1,11 +1,13 @@
 import json
 import os
+import struct
+import zlib
 from pathlib import Path
 
 import pytest
 
 import branca.utilities as ut
-from branca.colormap import LinearColormap
+from branca.colormap import LinearColormap, StepColormap
 
 rootpath = Path(os.path.dirname(os.path.abspath(__file__))) / ".." / "branca"
 color_brewer_minimum_n = 3
@@ -23,7 +25,7 @@ with open(rootpath / "scheme_base_codes.json") as f:
 
 def test_color_brewer_base():
     scheme = ut.color_brewer("YlGnBu", 9)
-    assert scheme == [
+    assert scheme == (
         "#ffffd9",
         "#edf8b1",
         "#c7e9b4",
@@ -33,7 +35,7 @@ def test_color_brewer_base():
         "#225ea8",
         "#253494",
         "#081d58",
-    ]
+    )
 
 
 def test_color_brewer_reverse():
@@ -42,6 +44,16 @@ def test_color_brewer_reverse():
     assert scheme[::-1] == scheme_r
 
 
+def test_color_brewer_cached():
+    scheme = ut.color_brewer("viridis", 12)
+    assert len(scheme) == 12
+    assert ut.color_brewer("viridis", 12) is scheme
+    assert len(ut.color_brewer("viridis_r", 12)) == 12
+    assert isinstance(ut.color_brewer("Set1", 5), tuple)
+    with pytest.raises(ValueError, match="between 3 and 9"):
+        ut.color_brewer("Set1", 12)
+
+
 def test_color_brewer_extendability():
     """
     The non-qualitative schemes should be extendable.
@@ -138,6 +150,63 @@ def test_parse_size_exceptions(value):
         ut._parse_size(value)
 
 
+def _paeth(a, b, c):
+    p = a + b - c
+    pa, pb, pc = abs(p - a), abs(p - b), abs(p - c)
+    if pa <= pb and pa <= pc:
+        return a
+    return b if pb <= pc else c
+
+
+def _read_png(png):
+    """Decodes the pixels of an 8-bit RGBA PNG or of an indexed PNG, following
+    the specification one byte at a time. Returns an array of RGBA bytes.
+    """
+    import numpy as np
+
+    width, height, bit_depth, color_type = struct.unpack("!2I2B", png[16:26])
+    data, position = b"", 8
+    palette, alpha = b"", b""
+    while position < len(png):
+        (length,) = struct.unpack("!I", png[position : position + 4])
+        tag = png[position + 4 : position + 8]
+        content = png[position + 8 : position + 8 + length]
+        if tag == b"IDAT":
+            data += content
+        elif tag == b"PLTE":
+            palette = content
+        elif tag == b"tRNS":
+            alpha = content
+        position += 12 + length
+    raw = zlib.decompress(data)
+    bpp = 4 if color_type == 6 else 1
+    stride = (width * bpp * bit_depth + 7) // 8
+    previous = [0] * stride
+    pixels = []
+    for y in range(height):
+        filter_type = raw[y * (stride + 1)]
+        row = list(raw[y * (stride + 1) + 1 : (y + 1) * (stride + 1)])
+        for x in range(stride):
+            a = row[x - bpp] if x >= bpp else 0
+            b = previous[x]
+            c = previous[x - bpp] if x >= bpp else 0
+            predictor = [0, a, b, (a + b) // 2, _paeth(a, b, c)][filter_type]
+            row[x] = (row[x] + predictor) % 256
+        previous = row
+        if color_type == 3:
+            indices = [
+                (row[x * bit_depth // 8] >> (8 - bit_depth - x * bit_depth % 8))
+                & ((1 << bit_depth) - 1)
+                for x in range(width)
+            ]
+            row = []
+            for i in indices:
+                row += list(palette[3 * i : 3 * i + 3])
+                row.append(alpha[i] if i < len(alpha) else 255)
+        pixels.append(row)
+    return np.array(pixels, dtype=np.uint8).reshape(height, width, 4)
+
+
 def test_write_png_mono():
     mono_image = [
         [0.24309289, 0.75997446, 0.02971671, 0.52830537],
@@ -152,6 +221,218 @@ def test_write_png_mono():
     assert ut.write_png(mono_image, colormap=colormap) == color_png
 
 
+def test_write_png_mono_vectorized():
+    np = pytest.importorskip("numpy")
+    image = np.random.default_rng(0).random((30, 40))
+    colormap = LinearColormap(colors=["red", "yellow", "green"], index=[0, 0.3, 1])
+
+    png = ut.write_png(image, colormap=colormap)
+    assert png == ut.write_png(image, colormap=lambda x: colormap.rgba_floats_tuple(x))
+    assert png == ut.write_png(image, colormap=colormap.color_scale)
+    assert ut.write_png(image) == ut.write_png(image, colormap=lambda x: (x, x, x, 1))
+
+    image[0, 0] = np.nan
+    pixels = _read_png(ut.write_png(image, colormap=colormap))
+    assert pixels.shape == (30, 40, 4)
+    assert pixels[0, 0].tolist() == [0, 0, 0, 0]
+    assert pixels[0, 1, 3] == 255
+
+
+@pytest.mark.parametrize(
+    "png_filter",
+    ["none", "sub", "up", "average", "paeth", "adaptive"],
+)
+def test_write_png_filters(png_filter):
+    np = pytest.importorskip("numpy")
+    rng = np.random.default_rng(0)
+    image = rng.integers(0, 256, (13, 17, 4), dtype=np.uint8)
+    image[5:] = np.linspace(0, 255, 17 * 4).reshape(17, 4)  # A smooth area.
+    png = ut.write_png(image, png_filter=png_filter)
+    np.testing.assert_array_equal(_read_png(png), image)
+    png = ut.write_png(image, origin="lower", png_filter=png_filter, compression=1)
+    np.testing.assert_array_equal(_read_png(png), image[::-1])
+
+
+def test_write_png_compression():
+    np = pytest.importorskip("numpy")
+    image = np.tile(np.linspace(0, 1, 300), (200, 1))
+    png = ut.write_png(image)
+    assert ut.write_png(image, compression=9, strategy="default") == png
+    assert len(ut.write_png(image, compression=0)) > len(png)
+    for strategy in ["filtered", "huffman", "rle", "fixed"]:
+        np.testing.assert_array_equal(
+            _read_png(ut.write_png(image, strategy=strategy)),
+            _read_png(png),
+        )
+    assert len(ut.write_png(image, png_filter="adaptive")) < len(png)
+    with pytest.raises(ValueError):
+        ut.write_png(image, strategy="fastest")
+    with pytest.raises(ValueError):
+        ut.write_png(image, png_filter="median")
+
+
+@pytest.mark.parametrize("png_filter", ["none", "paeth", "adaptive"])
+@pytest.mark.parametrize("origin", ["upper", "lower"])
+def test_write_png_stream(tmp_path, png_filter, origin):
+    import io
+
+    np = pytest.importorskip("numpy")
+    rng = np.random.default_rng(0)
+    colormap = LinearColormap(colors=["red", "yellow", "green"])
+    images = [
+        (rng.random((23, 11)) * 0.8, colormap),
+        (rng.random((23, 11)), None),
+        (rng.random((23, 11, 3)), None),
+        (rng.integers(0, 256, (23, 11, 4), dtype=np.uint8), None),
+    ]
+    for image, cmap in images:
+        expected = ut.write_png(
+            image,
+            origin=origin,
+            colormap=cmap,
+            png_filter=png_filter,
+        )
+        output = io.BytesIO()
+        ut.write_png_stream(
+            image,
+            output,
+            origin=origin,
+            colormap=cmap,
+            png_filter=png_filter,
+            strip_height=5,
+            idat_size=100,
+        )
+        png = output.getvalue()
+        assert png.count(b"IDAT") > 2
+        np.testing.assert_array_equal(_read_png(png), _read_png(expected))
+
+    np.save(tmp_path / "image.npy", image)
+    ut.write_png_stream(tmp_path / "image.npy", tmp_path / "image.png", strip_height=4)
+    png = (tmp_path / "image.png").read_bytes()
+    np.testing.assert_array_equal(_read_png(png), image)
+    with pytest.raises(ValueError):
+        ut.write_png_stream(image, io.BytesIO(), strip_height=0)
+
+
+def _idat_data(png):
+    data, position = b"", 8
+    while position < len(png):
+        (length,) = struct.unpack("!I", png[position : position + 4])
+        if png[position + 4 : position + 8] == b"IDAT":
+            data += png[position + 8 : position + 8 + length]
+        position += length + 12
+    return data
+
+
+def test_write_png_workers():
+    import io
+
+    np = pytest.importorskip("numpy")
+    rng = np.random.default_rng(0)
+    image = rng.integers(0, 256, (300, 257, 4), dtype=np.uint8)
+    image[100:200] = 7
+    expected = ut.write_png(image)
+    assert ut.write_png(image, workers=None) == expected
+    for workers in [1, 3]:
+        for compression in [-1, 0, 9]:
+            png = ut.write_png(image, compression=compression, workers=workers)
+            assert zlib.decompress(_idat_data(png)) == zlib.decompress(
+                _idat_data(expected),
+            )
+            np.testing.assert_array_equal(_read_png(png), image)
+        output = io.BytesIO()
+        ut.write_png_stream(
+            image,
+            output,
+            png_filter="adaptive",
+            strip_height=7,
+            idat_size=1000,
+            workers=workers,
+        )
+        np.testing.assert_array_equal(_read_png(output.getvalue()), image)
+    for workers in [0, -1]:
+        with pytest.raises(ValueError):
+            ut.write_png(image, workers=workers)
+
+
+@pytest.mark.parametrize("origin", ["upper", "lower"])
+def test_write_png_indexed(origin):
+    import io
+
+    np = pytest.importorskip("numpy")
+    image = np.random.default_rng(0).random((23, 11)) * 1.2 - 0.1
+    image[0, 0] = image[5, 3] = np.nan
+    colors = ["red", "#00ff0080", "blue", "yellow", "black"]
+    # The number of colors used, with the transparent one of NaN values,
+    # gives the bit depth.
+    for n, bit_depth in [(1, 1), (2, 2), (3, 2), (4, 4), (15, 4), (16, 8)]:
+        colormap = StepColormap((colors * 4)[:n], vmin=0, vmax=1)
+        png = ut.write_png(image, origin=origin, colormap=colormap, indexed=True)
+        assert png[24:26] == bytes([bit_depth, 3])
+        assert b"tRNS" in png
+        expected = _read_png(ut.write_png(image, origin=origin, colormap=colormap))
+        np.testing.assert_array_equal(_read_png(png), expected)
+
+        output = io.BytesIO()
+        ut.write_png_stream(
+            image,
+            output,
+            origin=origin,
+            colormap=colormap,
+            png_filter="adaptive",
+            strip_height=4,
+            idat_size=50,
+            indexed=True,
+        )
+        np.testing.assert_array_equal(_read_png(output.getvalue()), expected)
+
+    # Without missing values nor transparent colors, there is no tRNS chunk.
+    png = ut.write_png(
+        np.nan_to_num(image), colormap=StepColormap(["red"]), indexed=True
+    )
+    assert b"tRNS" not in png
+    assert _read_png(png).reshape(-1, 4).tolist() == [[255, 0, 0, 255]] * 23 * 11
+
+    # Other colormaps are sampled into 255 colors.
+    colormap = LinearColormap(["red", "blue"], vmin=-0.1, vmax=1.1)
+    png = ut.write_png(image, colormap=colormap, indexed=True)
+    assert png[24:26] == bytes([8, 3])
+    pixels = _read_png(png).astype(int)
+    expected = _read_png(ut.write_png(image, colormap=colormap)).astype(int)
+    assert np.abs(pixels - expected).max() <= 1
+    np.testing.assert_array_equal(
+        _read_png(ut.write_png(image, colormap=colormap.color_scale, indexed=True)),
+        pixels,
+    )
+
+    with pytest.raises(ValueError):
+        ut.write_png(image, indexed=True)
+    with pytest.raises(ValueError):
+        ut.write_png(np.zeros((3, 4, 3)), colormap=colormap, indexed=True)
+
+
+def test_write_png_indexed_full_palette():
+    from branca.colormap import linear
+
+    np = pytest.importorskip("numpy")
+    # All the colors of the table are used, along with the NaN color.
+    image = np.linspace(0, 1, 1000).reshape(20, 50)
+    image[7, 7] = np.nan
+    png = ut.write_png(image, colormap=linear.viridis, indexed=True)
+    position = png.index(b"PLTE")
+    (length,) = struct.unpack("!I", png[position - 4 : position])
+    assert length == 3 * 256
+    pixels = _read_png(png).astype(int)
+    assert pixels[7, 7].tolist() == [0, 0, 0, 0]
+    expected = _read_png(ut.write_png(image, colormap=linear.viridis)).astype(int)
+    assert np.abs(pixels - expected).max() <= 2
+
+    many_colors = StepColormap(["red", "blue"] * 128)
+    ut.write_png(image[7:8, :7], colormap=many_colors, indexed=True)
+    with pytest.raises(ValueError, match="256 colors"):
+        ut.write_png(image, colormap=many_colors, indexed=True)
+
+
 def test_write_png_rgb():
     image_rgb = [
         [
@@ -169,3 +450,23 @@ def test_write_png_rgb():
     ]
     png = b'\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR\x00\x00\x00\x04\x00\x00\x00\x02\x08\x06\x00\x00\x00\x7f\xa8}c\x00\x00\x00-IDATx\xda\x01"\x00\xdd\xff\x00\xff\xa7G\xffp\xff+\xff\x9e\x1cH\xff9\x90$\xff\x00\x93\xe9\xb8\xff\x0cz\xe2\xff\xc6\xca\xff\xff\xd4W\xd0\xffYw\x15\x95\xcf\xb9@D\x00\x00\x00\x00IEND\xaeB`\x82'  # noqa E501
     assert ut.write_png(image_rgb) == png
+
+
+def test_linear_gradient():
+    assert ut.linear_gradient(["#000000", "#ff8000"], 3) == [
+        "#000000",
+        "#7f4000",
+        "#ff8000",
+    ]
+    assert ut.linear_gradient(["#000000", "#ffffff", "#000000"], 3)[1] == "#ffffff"
+
+
+def test_linear_gradient_rgba():
+    np = pytest.importorskip("numpy")
+    hex_list = schemes["YlGnBu_09"]
+    colors = ut.linear_gradient_rgba(hex_list, 40)
+    assert colors.shape == (40, 4)
+    assert colors.dtype == np.uint8
+    expected = ut.linear_gradient(hex_list, 40)
+    assert ["#%02x%02x%02x" % tuple(c[:3]) for c in colors.tolist()] == expected
+    assert (colors[:, 3] == 255).all()